@@ -1,42 +1,108 @@
 # Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
 # SPDX-License-Identifier: MIT-0
 
-from util.log_generator import FakeLogs
-from util.line_pattern import LinePattern
-from util.tools import upload_folder_to_s3
-import util.faker_config as config
 import time
+
+import_start_time = time.perf_counter()
+
+from util.jobs import LambdaExecutor
+from util.jobs import parse_job
+from util.jobs import run_job
+from util.jobs import runs_async
+from util.jobs import shard_status
+from util.jobs import split_job
+from util.s3_stream import S3MultipartWriter
+import util.faker_config as config
+import base64
 import json
 import os
 
-import boto3
+import_seconds = time.perf_counter() - import_start_time
+cold_start = True
 
-# Get S3 resource
-s3 = boto3.resource('s3')
 log_bucket_name = os.environ.get('DEFAULT_LOG_S3_BUCKET_NAME')
 log_bucket_prefix = os.environ.get('DEFAULT_LOG_S3_BUCKET_PREFIX')
 
-log_types = ['cloudfront', 'nginx', 'apache']
-
 def lambda_handler(event, context):  
-    file_format = event['pathParameters']['logType']
-    if file_format in log_types:
-        start_time = time.time()
-        line_pattern = LinePattern(None, date_pattern="%Y-%m-%d\t%H:%M:%S", file_format="cloudfront")
-        FakeLogs(
-            filename="/tmp/fake_logs/" + config.output_name,
-            num_lines=config.log_lines,
-            line_pattern=line_pattern,
-            file_format=file_format
-        ).run()
-        end_time = time.time()
-        print("Finish generate %d lines log in %f secs" % (config.log_lines, end_time - start_time))
-        s3_bucket = s3.Bucket(log_bucket_name)
-        upload_folder_to_s3(s3_bucket, "/tmp/fake_logs", log_bucket_prefix)
-        return respond(None, "Success")
-    else:
-        return respond(ValueError('Unsupported log type "{}"'.format(file_format)))
-    
+    global cold_start
+    if cold_start:
+        print("Cold start, imports took %f secs" % import_seconds)
+        cold_start = False
+
+    if 'job' in event:
+        # Sub-job of a fanned out request, invoked asynchronously by this function
+        return run_sub_job(event['job'])
+
+    try:
+        job = parse_job(event['pathParameters']['logType'], parse_body(event))
+    except ValueError as e:
+        return respond(e)
+
+    start_time = time.time()
+    if runs_async(job):
+        # API Gateway would time out, sub-jobs report their status under the status prefix instead
+        sub_jobs = split_job(job)
+        shards = get_executor(context).submit(sub_jobs)
+        print("Submitted %d sub-jobs of job %s for %d lines in %f secs"
+              % (len(sub_jobs), job['job_id'], job['lines'], time.time() - start_time))
+        return respond(None, {'jobId': job['job_id'], 'lines': job['lines'], 'shards': shards,
+                              'status': status_prefix(job)})
+
+    run_job(job, opener=open_s3_object)
+    end_time = time.time()
+    print("Finish generate and upload %d lines log in %f secs" % (job['lines'], end_time - start_time))
+    return respond(None, "Success")
+
+
+def parse_body(event):
+    """Return the JSON body of an API Gateway request, {} when there is none."""
+    body = event.get('body')
+    if not body:
+        return {}
+    if event.get('isBase64Encoded'):
+        body = base64.b64decode(body)
+    try:
+        body = json.loads(body)
+    except ValueError:
+        raise ValueError("The request body must be a JSON object")
+    if not isinstance(body, dict):
+        raise ValueError("The request body must be a JSON object")
+    return body
+
+
+def get_executor(context):
+    """Executor of the sub-jobs, each one is an asynchronous invocation of this function."""
+    return LambdaExecutor(context.invoked_function_arn)
+
+
+def status_prefix(job):
+    """Statuses are kept outside of log_bucket_prefix, so that they are not ingested as logs."""
+    return 'fake-log-jobs/{}'.format(job['job_id'])
+
+
+def run_sub_job(job):
+    """Generate a sub-job and record its status as fake-log-jobs/<job id>/<shard>.json in the log bucket."""
+    import boto3
+    start_time = time.time()
+    try:
+        status = shard_status(job, 'done', files=run_job(job, opener=open_s3_object))
+    except Exception as e:
+        status = shard_status(job, 'failed', error=str(e))
+    status['seconds'] = time.time() - start_time
+    key = '{}/{:03d}.json'.format(status_prefix(job), job['shard'])
+    boto3.client('s3').put_object(Bucket=log_bucket_name, Key=key, Body=json.dumps(status).encode('utf-8'))
+    print("Sub-job %d/%d of job %s: %s" % (job['shard'] + 1, job['shards'], job['job_id'], json.dumps(status)))
+    return status
+
+
+def open_s3_object(filename):
+    """Stream a generated file to the log bucket, under the same key upload_folder_to_s3 would use."""
+    # boto3 is imported on first use, it is the slowest import of the cold start
+    import boto3
+    key = os.path.normpath(log_bucket_prefix + '/' + filename)
+    # A new client per object, worker processes must not share the connection pool of their parent
+    return S3MultipartWriter(boto3.client('s3'), log_bucket_name, key, part_size=config.s3_part_size)
+
 
 def respond(err, res=None):
     return {
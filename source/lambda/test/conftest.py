@@ -0,0 +1,8 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import os
+import sys
+
+# The function code imports its modules as util.*, from the root of the Lambda package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,39 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import pytest
+from util.daemon import LogStream
+from util.daemon import main
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_late_stream_catches_up_one_micro_batch_per_tick(tmp_path):
+    clock = FakeClock()
+    stream = LogStream(str(tmp_path / "app.log"), 100, file_format="nginx", clock=clock)
+    stream.tick(clock.now)
+    clock.now = 5.0
+
+    assert stream.tick(clock.now) == stream.micro_batch
+    assert stream.next_tick(clock.now) == clock.now
+    while stream.limiter.due(clock.now) > 0:
+        assert stream.tick(clock.now) <= stream.micro_batch
+    assert stream.limiter.emitted == 500
+    stream.close()
+
+
+
+def test_invalid_config_is_a_usage_error(tmp_path, capsys):
+    config_file = tmp_path / "streams.json"
+    for content in ('{"stream": []}', "[]", '{"streams": "app.log"}', "{"):
+        config_file.write_text(content)
+        with pytest.raises(SystemExit) as exc_info:
+            main(["--config", str(config_file)])
+        assert exc_info.value.code == 2
+        assert "invalid --config" in capsys.readouterr().err
@@ -0,0 +1,39 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import pytest
+from util.jobs import parse_job
+from util.jobs import run_job
+from util.jobs import runs_async
+from util.jobs import split_job
+
+
+@pytest.mark.parametrize("body", [
+    {"end": "2022-01-01T00:00:00"},
+    {"start": "2022-01-02T00:00:00", "end": "2022-01-01T00:00:00"},
+    {"start": "2022-01-01T00:00:00", "end": "2022-01-01T00:00:00"},
+])
+def test_invalid_windows_are_rejected(body):
+    with pytest.raises(ValueError):
+        parse_job("nginx", body)
+
+
+def test_window_starts_on_start(tmp_path):
+    job = parse_job("cloudfront", {"lines": 5, "start": "2022-01-01T00:00:00", "end": "2022-01-01T00:00:10",
+                                   "compression": "none"})
+    with open(run_job(job, output_dir=str(tmp_path))[0]) as f:
+        times = [line.split("\t")[1] for line in f]
+
+    assert times == ["00:00:00", "00:00:02", "00:00:04", "00:00:06", "00:00:08"]
+
+
+def test_large_jobs_run_asynchronously():
+    assert not runs_async(parse_job("nginx", {"lines": 10000}))
+
+    job = parse_job("nginx", {"lines": 150000, "start": "2022-01-01T00:00:00", "end": "2022-01-02T00:00:00"})
+    assert runs_async(job)
+    assert split_job(job) == [job]
+
+    sub_jobs = split_job(dict(job, lines=2500000))
+    assert [sub_job["lines"] for sub_job in sub_jobs] == [833334, 833333, 833333]
+    assert sub_jobs[0]["start"] == job["start"]
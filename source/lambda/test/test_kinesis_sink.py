@@ -0,0 +1,119 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import random
+import pytest
+from util.kinesis_sink import MAX_BATCH_BYTES
+from util.kinesis_sink import MAX_BATCH_RECORDS
+from util.kinesis_sink import MAX_RECORD_BYTES
+from util.kinesis_sink import KinesisSink
+
+
+class FakeClient:
+    """Firehose and Kinesis client failing a fraction of the entries of each call, delivered records are kept."""
+
+    def __init__(self, failure_rate=0.0, seed=0):
+        self.failure_rate = failure_rate
+        self.rng = random.Random(seed)
+        self.calls = []
+        self.delivered = []
+
+    def _put(self, records):
+        self.calls.append(records)
+        results = []
+        for record in records:
+            if self.rng.random() < self.failure_rate:
+                results.append({"ErrorCode": "ServiceUnavailableException", "ErrorMessage": "Slow down."})
+            else:
+                self.delivered.append(record)
+                results.append({"RecordId": str(len(self.delivered))})
+        return sum("ErrorCode" in result for result in results), results
+
+    def put_record_batch(self, DeliveryStreamName, Records):
+        failed, results = self._put(Records)
+        return {"FailedPutCount": failed, "RequestResponses": results}
+
+    def put_records(self, StreamName, Records):
+        failed, results = self._put(Records)
+        return {"FailedRecordCount": failed, "Records": results}
+
+
+def record_size(record):
+    return len(record["Data"]) + len(record.get("PartitionKey", "").encode("utf-8"))
+
+
+def delivered_lines(client):
+    return [line for record in client.delivered for line in record["Data"].decode("utf-8").splitlines()]
+
+
+@pytest.mark.parametrize("kind", ["firehose", "streams"])
+@pytest.mark.parametrize("aggregate_lines", [1, 10])
+def test_partial_failures_are_delivered_once(kind, aggregate_lines):
+    client = FakeClient(failure_rate=0.15, seed=1)
+    sink = KinesisSink(client, "fake-logs", kind=kind, aggregate_lines=aggregate_lines, max_retries=20,
+                       sleep=lambda secs: None)
+    lines = ["line {}".format(i) for i in range(12345)]
+    for start in range(0, len(lines), 1000):
+        sink.write("".join(line + "\n" for line in lines[start:start + 1000]))
+    sink.close()
+
+    # Retried records arrive after the others
+    assert sorted(delivered_lines(client)) == sorted(lines)
+    assert sink.stats()["retried_records"] > 0
+    # Only the failed records of a call are sent again
+    assert sum(len(call) for call in client.calls) == sink.stats()["records"] + sink.stats()["retried_records"]
+
+
+@pytest.mark.parametrize("kind", ["firehose", "streams"])
+def test_calls_stay_within_the_limits(kind):
+    client = FakeClient()
+    sink = KinesisSink(client, "fake-logs", kind=kind, aggregate_lines=1000)
+    # Records close to the record limit, then many small records
+    big_line = "x" * (200 * 1024)
+    sink.write_lines([big_line] * 60)
+    sink.write_lines(["small"] * 3000)
+    sink.close()
+
+    assert len(delivered_lines(client)) == 3060
+    for call in client.calls:
+        assert len(call) <= MAX_BATCH_RECORDS
+        assert sum(record_size(record) for record in call) <= MAX_BATCH_BYTES
+        for record in call:
+            assert record_size(record) <= MAX_RECORD_BYTES[kind]
+
+
+def test_small_lines_fill_calls_of_500_records():
+    client = FakeClient()
+    sink = KinesisSink(client, "fake-logs")
+    sink.write_lines(["line"] * 1200)
+    sink.close()
+
+    assert [len(call) for call in client.calls] == [500, 500, 200]
+
+
+def test_raises_after_max_retries():
+    client = FakeClient(failure_rate=1.0)
+    sleeps = []
+    sink = KinesisSink(client, "fake-logs", max_retries=3, sleep=sleeps.append)
+    sink.write_lines(["line"] * 10)
+    with pytest.raises(RuntimeError):
+        sink.flush()
+
+    assert len(sleeps) == 3
+    assert len(client.calls) == 4
+
+
+@pytest.mark.parametrize("kind", ["firehose", "streams"])
+def test_oversized_lines_are_rejected(kind):
+    sink = KinesisSink(FakeClient(), "fake-logs", kind=kind)
+    with pytest.raises(ValueError):
+        sink.write_lines(["x" * MAX_RECORD_BYTES[kind]])
+
+
+def test_streams_records_keep_room_for_the_partition_key():
+    client = FakeClient()
+    sink = KinesisSink(client, "fake-logs", kind="streams", partition_key=lambda: "k" * 256)
+    sink.write_lines(["x" * (sink.max_data_bytes - 1)])
+    sink.close()
+
+    assert record_size(client.delivered[0]) == MAX_RECORD_BYTES["streams"]
@@ -0,0 +1,35 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import datetime
+import os
+import pytest
+import util.faker_config as config
+from util.line_pattern import LinePattern
+from util.log_generator import FakeLogs
+
+date_pattern = config.date_patterns["cloudfront"]
+
+
+def hours_by_file(directory):
+    """Return {hour in the file name: set of the hours of its lines}."""
+    hours = {}
+    for name in os.listdir(directory):
+        with open(os.path.join(directory, name)) as f:
+            hours[name.split(".")[1]] = {line[:13].replace("\t", "-") for line in f}
+    return hours
+
+
+@pytest.mark.parametrize("step", [None, 1])
+def test_time_rotation_follows_hours(tmp_path, step):
+    line_pattern = LinePattern(date_pattern=date_pattern, file_format="cloudfront", seed=1,
+                               date=datetime.datetime(2022, 1, 1))
+    line_pattern.sleep = step
+    fake_logs = FakeLogs(str(tmp_path / "cloudfront.log"), num_lines=10000, line_pattern=line_pattern,
+                         rotate_seconds=3600, seed=1)
+    fake_logs.run()
+
+    hours = hours_by_file(tmp_path)
+    assert len(hours) == len(fake_logs.filenames) == 3
+    for name, line_hours in hours.items():
+        assert line_hours == {name}
@@ -0,0 +1,150 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import datetime
+import http.server
+import json
+import threading
+import pytest
+from util.line_pattern import LinePattern
+from util.opensearch_sink import OpenSearchSink
+
+
+class BulkHandler(http.server.BaseHTTPRequestHandler):
+    """_bulk endpoint answering with the next scripted response of the server, 200 by default."""
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        with self.server.lock:
+            self.server.requests.append((self.path, self.headers["Content-Type"], body))
+            script = self.server.script.pop(0) if self.server.script else "ok"
+
+        lines = body.decode("utf-8").splitlines()
+        if script == "throttle":
+            self.send_response(429)
+            self.send_header("Retry-After", "0")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if script == "fail":
+            self.send_response(500)
+            self.send_header("Content-Length", "4")
+            self.end_headers()
+            self.wfile.write(b"boom")
+            return
+
+        items = []
+        for i in range(len(lines) // 2):
+            # "reject": the first document of the request is rejected
+            status = 400 if script == "reject" and i == 0 else 201
+            items.append({"index": {"status": status}})
+        data = json.dumps({"errors": script == "reject", "items": items}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), BulkHandler)
+    server.lock = threading.Lock()
+    server.requests = []
+    server.script = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def create_sink(server, **options):
+    return OpenSearchSink("http://127.0.0.1:{}".format(server.server_port), "fake-logs", **options)
+
+
+def sent_documents(server):
+    documents = []
+    for path, content_type, body in server.requests:
+        lines = body.decode("utf-8").splitlines()
+        assert [json.loads(line) for line in lines[0::2]] == [{"index": {}}] * (len(lines) // 2)
+        documents += [json.loads(line) for line in lines[1::2]]
+    return documents
+
+
+def test_ndjson_framing(server):
+    sink = create_sink(server, bulk_bytes=1000)
+    records = [{"i": i, "message": "x" * 40} for i in range(100)]
+    sink.write_records(records)
+    sink.close()
+
+    assert len(server.requests) > 1
+    for path, content_type, body in server.requests:
+        assert path == "/fake-logs/_bulk"
+        assert content_type == "application/x-ndjson"
+        assert body.endswith(b"\n")
+    # Requests are sent concurrently, so they may arrive in any order
+    assert sorted(sent_documents(server), key=lambda document: document["i"]) == records
+
+
+def test_throttled_requests_are_retried(server):
+    server.script = ["throttle", "throttle"]
+    sleeps = []
+    sink = create_sink(server, sleep=sleeps.append)
+    sink.write_records([{"i": i} for i in range(10)])
+    sink.close()
+
+    assert sleeps == [0.0, 0.0]
+    assert sink.stats()["docs"] == 10
+    assert sink.stats()["throttled"] == 20
+    assert sink.stats()["requests"] == 3
+
+
+def test_rejected_items_are_errors(server):
+    server.script = ["reject"]
+    sink = create_sink(server)
+    sink.write_records([{"i": i} for i in range(10)])
+    sink.close()
+
+    stats = sink.stats()
+    assert stats["docs"] == 9
+    assert stats["errors"] == 1
+
+
+def test_failed_requests_are_raised_and_counted(server):
+    server.script = ["fail"]
+    sink = create_sink(server)
+    sink.write_records([{"i": i} for i in range(10)])
+    with pytest.raises(RuntimeError):
+        sink.close()
+    sink.abort()
+
+    assert sink.stats()["docs"] == 0
+    assert sink.stats()["errors"] == 10
+
+
+def test_stats(server):
+    sink = create_sink(server, bulk_bytes=100)
+    size = sink.write_records([{"i": i} for i in range(50)])
+    sink.close()
+
+    stats = sink.stats()
+    assert stats["docs"] == 50
+    assert stats["bytes"] == size
+    assert stats["requests"] == len(server.requests)
+    assert stats["throttled"] == stats["errors"] == 0
+    assert 0 < stats["latency_p50"] <= stats["latency_p99"] <= stats["latency_max"]
+    assert stats["docs_per_sec"] > 0
+
+
+def test_documents_have_iso_dates(server):
+    line_pattern = LinePattern(file_format="cloudfront", seed=1, date=datetime.datetime(2022, 1, 1))
+    sink = create_sink(server)
+    sink.write_records(line_pattern.create_records(5))
+    sink.close()
+
+    for document in sent_documents(server):
+        datetime.datetime.fromisoformat(document["timestamp"])
+        assert "\t" not in document["timestamp"]
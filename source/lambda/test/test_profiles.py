@@ -0,0 +1,25 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import pytest
+from util.profiles import LoadProfile
+
+
+def test_repeating_profile_without_lines_is_rejected():
+    spec = {"phases": [{"duration": 60, "rate": 0}, {"shape": "ramp", "duration": 60, "start": 0, "end": 0}],
+            "bursts": {"interval": 10, "duration": 5, "multiplier": 4}, "repeat": True}
+    with pytest.raises(ValueError, match="positive rate"):
+        LoadProfile.from_dict(spec)
+
+
+def test_repeating_profile_reaches_every_line():
+    profile = LoadProfile.from_dict({"phases": [{"duration": 10, "rate": 0},
+                                                {"shape": "ramp", "duration": 10, "start": 0, "end": 10}],
+                                     "repeat": True})
+    # 50 lines per period, all of them in the ramp
+    assert profile.cursor().time_at(100) == pytest.approx(40.0)
+
+
+def test_finite_profile_without_lines_ends():
+    profile = LoadProfile.from_dict({"phases": [{"duration": 10, "rate": 0}]})
+    assert profile.cursor().time_at(1) is None
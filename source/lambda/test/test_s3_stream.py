@@ -0,0 +1,121 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import gc
+import time
+import boto3
+import pytest
+from moto import mock_aws
+from util.s3_stream import MIN_PART_SIZE
+from util.s3_stream import S3MultipartWriter
+
+bucket = "fake-logs-test"
+
+
+@pytest.fixture
+def s3():
+    with mock_aws():
+        client = boto3.client("s3", region_name="us-east-1")
+        client.create_bucket(Bucket=bucket)
+        yield client
+
+
+def objects(s3):
+    return [item["Key"] for item in s3.list_objects_v2(Bucket=bucket).get("Contents", [])]
+
+
+def pending_uploads(s3):
+    return s3.list_multipart_uploads(Bucket=bucket).get("Uploads", [])
+
+
+def read(s3, key):
+    return s3.get_object(Bucket=bucket, Key=key)["Body"].read()
+
+
+def test_multipart_upload(s3):
+    data = bytes(range(256)) * (MIN_PART_SIZE * 2 // 256 + 1000)
+    with S3MultipartWriter(s3, bucket, "logs/big.log", part_size=MIN_PART_SIZE, max_workers=2) as writer:
+        for start in range(0, len(data), 1000000):
+            writer.write(data[start:start + 1000000])
+
+    assert writer.upload_id is not None
+    assert len(writer._parts) == 3
+    assert read(s3, "logs/big.log") == data
+    assert pending_uploads(s3) == []
+
+
+def test_small_object_is_a_single_put(s3):
+    with S3MultipartWriter(s3, bucket, "logs/small.log") as writer:
+        writer.write(b"line 1\n")
+        writer.write(b"line 2\n")
+
+    assert writer.upload_id is None
+    assert read(s3, "logs/small.log") == b"line 1\nline 2\n"
+
+
+def test_exception_aborts_the_upload(s3):
+    with pytest.raises(RuntimeError):
+        with S3MultipartWriter(s3, bucket, "logs/failed.log", part_size=MIN_PART_SIZE) as writer:
+            writer.write(b"x" * (MIN_PART_SIZE + 1))
+            raise RuntimeError("generation failed")
+
+    assert writer.upload_id is not None
+    assert objects(s3) == []
+    assert pending_uploads(s3) == []
+
+
+@pytest.mark.parametrize("size", [10, MIN_PART_SIZE + 1])
+def test_dropped_writer_publishes_nothing(s3, size):
+    writer = S3MultipartWriter(s3, bucket, "logs/dropped.log", part_size=MIN_PART_SIZE)
+    writer.write(b"x" * size)
+    parts = list(writer._parts)
+    del writer
+    # A part in flight holds the writer until its upload thread is done with it
+    for part in parts:
+        part.result()
+    deadline = time.monotonic() + 5
+    while pending_uploads(s3) and time.monotonic() < deadline:
+        gc.collect()
+        time.sleep(0.05)
+
+    assert objects(s3) == []
+    assert pending_uploads(s3) == []
+
+
+def test_fake_logs_aborts_when_the_codec_fails(s3):
+    from util.log_generator import FakeLogs
+
+    with pytest.raises(ValueError):
+        FakeLogs("logs/cloudfront.log.gz", num_lines=10, codec="unknown",
+                 opener=lambda filename: S3MultipartWriter(s3, bucket, filename))
+
+    assert objects(s3) == []
+    assert pending_uploads(s3) == []
+
+
+def test_fake_logs_upload(s3):
+    from util.log_generator import FakeLogs
+
+    fake_logs = FakeLogs("logs/cloudfront.log", num_lines=100, file_format="cloudfront", seed=1,
+                         opener=lambda filename: S3MultipartWriter(s3, bucket, filename))
+    fake_logs.run()
+
+    assert objects(s3) == ["logs/cloudfront.log"]
+    assert read(s3, "logs/cloudfront.log").count(b"\n") == 100
+
+
+def test_fake_logs_time_rotation_drops_the_guessed_object(s3):
+    import datetime
+    from util.line_pattern import LinePattern
+    from util.log_generator import FakeLogs
+
+    # Lines go back in time from midnight, the first one is already in the previous hour
+    line_pattern = LinePattern(file_format="cloudfront", seed=1, date=datetime.datetime(2022, 1, 1))
+    line_pattern.sleep = -1
+    fake_logs = FakeLogs("logs/cloudfront.log", num_lines=5000, line_pattern=line_pattern, rotate_seconds=3600,
+                         opener=lambda filename: S3MultipartWriter(s3, bucket, filename))
+    fake_logs.run()
+
+    assert sorted(key.split(".")[1] for key in objects(s3)) == ["2021-12-31-22", "2021-12-31-23"]
+    assert sorted(objects(s3)) == sorted(fake_logs.filenames)
+    assert pending_uploads(s3) == []
@@ -0,0 +1,80 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import collections
+import random
+import pytest
+import util.cloudfront_faker as cloudfront_faker
+from util.tools import WeightedChoice
+
+tables = [
+    (["GET", "POST", "DELETE", "PUT"], [0.8, 0.1, 0.03, 0.07]),
+    (["200", "404", "500", "301"], [0.9, 0.04, 0.02, 0.04]),
+    (["a", "b", "c"], None),
+    (["a", "b", "c", "d"], [5, 0, 1, 2]),
+]
+
+
+def linear_scan(values, weights, rng):
+    """The previous WeightedChoice.run, a linear scan of the weights."""
+    if weights is None:
+        weights = [1] * len(values)
+    choices = list(zip(values, weights))
+    total = sum(weight for value, weight in choices)
+
+    def run():
+        rnd = rng.uniform(0, total)
+        upto = 0
+        for choice, weight in choices:
+            if upto + weight >= rnd:
+                return choice
+            upto += weight
+        assert False, "Shouldn't get here."
+
+    return run
+
+
+@pytest.mark.parametrize("values, weights", tables)
+def test_run_matches_linear_scan(values, weights):
+    expected = linear_scan(values, weights, random.Random(7))
+    choice = WeightedChoice(values, weights, rng=random.Random(7))
+    assert [choice.run() for _ in range(10000)] == [expected() for _ in range(10000)]
+
+
+@pytest.mark.parametrize("values, weights", tables)
+def test_run_many_matches_linear_scan(values, weights):
+    expected = linear_scan(values, weights, random.Random(7))
+    choice = WeightedChoice(values, weights, rng=random.Random(7))
+    assert choice.run_many(10000) == [expected() for _ in range(10000)]
+
+
+@pytest.mark.parametrize("values, weights", tables)
+def test_frequencies(values, weights):
+    weights = [1] * len(values) if weights is None else weights
+    draws = 100000
+    counts = collections.Counter(WeightedChoice(values, weights, rng=random.Random(1)).run_many(draws))
+    for value, weight in zip(values, weights):
+        assert counts[value] / draws == pytest.approx(weight / sum(weights), abs=0.01)
+
+
+def test_extra_weights_are_ignored():
+    # cs-uri-stem has 10 values and 11 weights, the last weight was never drawn
+    choice = cloudfront_faker.init_cs_uri_stem(random.Random(3))
+    assert len(choice.values) == 10
+    assert choice.total == pytest.approx(1.0)
+
+    weights = [0.3, 0.25, 0.15, 0.05, 0.05, 0.04, 0.04, 0.04, 0.04, 0.04, 0.04]
+    expected = linear_scan(choice.values, weights, random.Random(3))
+    assert [choice.run() for _ in range(10000)] == [expected() for _ in range(10000)]
+
+
+def test_values_without_weight_are_rejected():
+    with pytest.raises(ValueError):
+        WeightedChoice(["a", "b", "c"], [0.5, 0.5])
+
+
+def test_tables_are_shared():
+    first = WeightedChoice(["GET", "POST"], [0.9, 0.1], rng=random.Random(1))
+    second = WeightedChoice(["GET", "POST"], [0.9, 0.1], rng=random.Random(2))
+    assert first.table is second.table
+    assert first.run_many(100) != second.run_many(100)
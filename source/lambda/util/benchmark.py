@@ -0,0 +1,229 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""Benchmarks of the log faker.
+
+Run the suite and save the results:
+    python -m util.benchmark run -o before.json
+Compare two runs, the exit code is 1 when a metric regressed by more than the threshold:
+    python -m util.benchmark compare before.json after.json --threshold 0.1
+"""
+
+import argparse
+import datetime
+import json
+import platform
+import random
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+from faker import Faker
+import util.faker_config as config
+from util.fake_tokens import FakeTokens
+from util.line_pattern import LinePattern
+from util.tools import IPPool
+from util.tools import WeightedChoice
+
+
+def best_of(repeat, func):
+    """Return the shortest duration of repeat calls of func."""
+    durations = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - start_time)
+    return min(durations)
+
+
+def metric(value, unit, better):
+    return {"value": value, "unit": unit, "better": better}
+
+
+def bench_patterns(num_lines, repeat):
+    """lines/sec and bytes/sec of every pattern, line by line and in batch."""
+    results = {}
+    for file_format, pattern in config.patterns.items():
+        line_pattern = LinePattern(pattern)
+        size = len("\n".join(line_pattern.create_lines(num_lines))) + 1
+
+        seconds = best_of(repeat, lambda: [line_pattern.create_line() for _ in range(num_lines)])
+        results["{}.create_line.lines_per_sec".format(file_format)] = metric(num_lines / seconds, "lines/s", "higher")
+
+        seconds = best_of(repeat, lambda: line_pattern.create_lines(num_lines))
+        results["{}.create_lines.lines_per_sec".format(file_format)] = metric(num_lines / seconds, "lines/s", "higher")
+        results["{}.create_lines.bytes_per_sec".format(file_format)] = metric(size / seconds, "B/s", "higher")
+    return results
+
+
+def import_seconds(module):
+    """Import time of a module in a fresh interpreter."""
+    code = "import time; start = time.perf_counter(); import {}; print(time.perf_counter() - start)".format(module)
+    output = subprocess.run([sys.executable, "-c", code], check=True, capture_output=True, text=True).stdout
+    return float(output)
+
+
+def bench_imports(repeat):
+    """Cold import cost of the modules loaded by the Lambda function."""
+    return {
+        "import.{}.seconds".format(module): metric(min(import_seconds(module) for _ in range(repeat)), "s", "lower")
+        for module in ("util.line_pattern", "util.log_generator")
+    }
+
+
+def bench_construction(repeat):
+    """Construction cost of FakeTokens with the tokens of the cloudfront pattern built, and of LinePattern."""
+    fake_tokens = FakeTokens()
+    keys = LinePattern(file_format="cloudfront", fake_tokens=fake_tokens).keys
+
+    def build_tokens():
+        # Tokens are built on first lookup, FakeTokens() alone builds none of them
+        dispatcher = FakeTokens().get_tokens()
+        return [dispatcher[key] for key in keys]
+
+    return {
+        "FakeTokens.init_tokens.seconds": metric(best_of(repeat, build_tokens), "s", "lower"),
+        "LinePattern.init.seconds": metric(
+            best_of(repeat, lambda: LinePattern(file_format="cloudfront", fake_tokens=fake_tokens)), "s", "lower"),
+    }
+
+
+def bench_weighted_choice(calls, repeat):
+    """Per call cost of WeightedChoice.run, for a small table as the ones of the method and status tokens."""
+    rng = WeightedChoice(["GET", "POST", "DELETE", "PUT"], [0.8, 0.1, 0.05, 0.05])
+    seconds = best_of(repeat, lambda: [rng.run() for _ in range(calls)])
+    return {"WeightedChoice.run.small.ns_per_call": metric(seconds / calls * 1e9, "ns", "lower")}
+
+
+def bench_ip_pool(calls, repeat):
+    """Per address cost of the client IP pool (c-ip), one by one and in batch."""
+    pool = IPPool.from_regions(config.country_ip_cidrs, config.country_ip_weights)
+    return {
+        "IPPool.run.ns_per_call": metric(
+            best_of(repeat, lambda: [pool.run() for _ in range(calls)]) / calls * 1e9, "ns", "lower"),
+        "IPPool.run_many.ns_per_call": metric(best_of(repeat, lambda: pool.run_many(calls)) / calls * 1e9, "ns",
+                                              "lower"),
+    }
+
+
+def instance_bytes(factory, instances):
+    """Bytes allocated per instance built by factory, measured with tracemalloc over a batch of instances.
+
+    The first instance is built before measuring, so that the tables shared between instances are not counted.
+    """
+    keep = [factory()]
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        keep += [factory() for _ in range(instances)]
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    return sum(stat.size_diff for stat in after.compare_to(before, "filename")) / instances
+
+
+def bench_memory(instances):
+    """Memory retained by each generator instance, with every token of its pattern built."""
+    results = {}
+    for file_format in ("cloudfront", "elf"):
+        def factory():
+            line_pattern = LinePattern(file_format=file_format)
+            line_pattern.create_lines(1)
+            return line_pattern
+
+        results["{}.instance.bytes".format(file_format)] = metric(instance_bytes(factory, instances), "B", "lower")
+    results["FakeTokens.instance.bytes"] = metric(instance_bytes(FakeTokens, instances), "B", "lower")
+    return results
+
+
+def peak_rss():
+    """Peak resident set size of the process in bytes."""
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss if sys.platform == "darwin" else maxrss * 1024
+
+
+def run(num_lines=10000, calls=100000, repeat=3, seed=0, instances=20):
+    """Run every benchmark, return a JSON serializable dict."""
+    random.seed(seed)
+    Faker.seed(seed)
+    results = {}
+    results.update(bench_imports(repeat))
+    results.update(bench_construction(repeat))
+    results.update(bench_weighted_choice(calls, repeat))
+    results.update(bench_ip_pool(calls, repeat))
+    results.update(bench_patterns(num_lines, repeat))
+    results.update(bench_memory(instances))
+    results["peak_rss.bytes"] = metric(peak_rss(), "B", "lower")
+    return {
+        "meta": {
+            "date": datetime.datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "num_lines": num_lines,
+            "calls": calls,
+            "repeat": repeat,
+            "seed": seed,
+            "instances": instances,
+        },
+        "results": results,
+    }
+
+
+def compare(baseline, current, threshold=0.1):
+    """Return (rows, regressions) where each row is (name, baseline, current, relative change)."""
+    rows = []
+    regressions = []
+    for name, result in sorted(current["results"].items()):
+        if name not in baseline["results"]:
+            continue
+
+        before = baseline["results"][name]["value"]
+        after = result["value"]
+        change = (after - before) / before if before else 0.0
+        rows.append((name, before, after, change))
+        worse = -change if result["better"] == "higher" else change
+        if worse > threshold:
+            regressions.append(name)
+    return rows, regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks of the log faker.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    run_parser = subparsers.add_parser("run", help="run the benchmarks")
+    run_parser.add_argument("-o", "--output", help="JSON result file (default: stdout)")
+    run_parser.add_argument("-n", "--num", type=int, default=10000, help="lines generated per pattern and repeat")
+    run_parser.add_argument("--calls", type=int, default=100000, help="WeightedChoice and IPPool calls per repeat")
+    run_parser.add_argument("--repeat", type=int, default=3, help="repeats, the best one is kept")
+    run_parser.add_argument("--seed", type=int, default=0, help="seed of the random generators")
+    run_parser.add_argument("--instances", type=int, default=20, help="instances built to measure their memory")
+    compare_parser = subparsers.add_parser("compare", help="compare two JSON result files")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=0.1, help="relative change flagged as regression")
+    args = parser.parse_args(argv)
+
+    if args.command == "run":
+        results = run(args.num, args.calls, args.repeat, args.seed, args.instances)
+        if args.output is None:
+            json.dump(results, sys.stdout, indent=2)
+        else:
+            with open(args.output, "w") as f:
+                json.dump(results, f, indent=2)
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    rows, regressions = compare(baseline, current, args.threshold)
+    for name, before, after, change in rows:
+        flag = "REGRESSION" if name in regressions else ""
+        print("{:<45} {:>16.6g} {:>16.6g} {:>+8.1%} {}".format(name, before, after, change, flag))
+    print("{} regression(s) above {:.0%}".format(len(regressions), args.threshold))
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,14 +2,24 @@
 # SPDX-License-Identifier: MIT-0
 
 import random
-from faker import Faker
+import util.distributions as distributions
 from util.tools import WeightedChoice
-from util.tools import random_ipv4_from_region
+from util.tools import batched
+from util.tools import constant
 
-faker = Faker()
+faker = None
 
 
-def init_x_edge_location():
+def get_faker():
+    """Return the module Faker instance, Faker is imported and instantiated on first use."""
+    global faker
+    if faker is None:
+        from faker import Faker
+        faker = Faker()
+    return faker
+
+
+def init_x_edge_location(rand=random):
     rng = WeightedChoice(["ARN1-C1", "ARN53", "ATL52-C1", "BOS50-C2", "CDG3-C1", "CDG50-C1", "CDG53-C1", "CDG54",
                           "CPT50", "3-C1", "EWR53-C2", "FCO50-P1", "FRA53-C1", "FRA54", "GIG51-C1", "GRU1-C1",
                           "HAM50-C3", "HIO51-C1", "HKG50", "HKG51", "HKG53", "HYD50-C4", "IAD16", "IAD53",
@@ -17,37 +27,36 @@ def init_x_edge_location():
                           "LAX1", "LAX3-C1", "LAX50-C1", "LHR3-C1", "LHR4", "LHR50-C1", "LHR62-C1", "LHR62-C5",
                           "MAA3", "MAN50-C1", "MAN50-C2", "MIA3-C1", "MIA50", "MRS50", "MXP64-C3", "NRT12-C1",
                           "NRT20-C1", "NRT51-C1", "NRT52", "NRT53", "NRT57-C2", "ORD51-C1", "SEA19-C2", "SEA32",
-                          "SEA4", "SFO5-P2", "SFO9"])
-    return rng.run
+                          "SEA4", "SFO5-P2", "SFO9"], rng=rand)
+    return rng
 
 
-def init_sc_bytes():
+def init_sc_bytes(rand=random):
     """Return the size of the object returning by the client (%b)."""
-    return lambda: int(random.gauss(55000, 8000))
+    return distributions.from_config("sc-bytes", int, rand)
 
 
-def init_c_ip(ip_list):
-    rng = WeightedChoice(ip_list)
-    return rng.run
+def init_c_ip(ip_pool):
+    return ip_pool
 
 
-def init_cs_method():
+def init_cs_method(rand=random):
     """Return the request method (%m)."""
-    rng = WeightedChoice(["GET", "POST", "DELETE", "PUT"], [0.8, 0.1, 0.03, 0.07])
-    return rng.run
+    rng = WeightedChoice(["GET", "POST", "DELETE", "PUT"], [0.8, 0.1, 0.03, 0.07], rng=rand)
+    return rng
 
 
-def init_cs_host():
+def init_cs_host(rand=random):
     rng = WeightedChoice(["d111111abcdef8.cloudfront.net",
                           "d3nnlo1goc4bi6.cloudfront.net",
                           "d13456asdfqef8.cloudfront.net",
                           "dcasdis99234ds.cloudfront.net",
                           "zxcvtyu678543d.cloudfront.net",
-                          "dasdqwe3456sdf.cloudfront.net"])
-    return rng.run
+                          "dasdqwe3456sdf.cloudfront.net"], rng=rand)
+    return rng
 
 
-def init_cs_uri_stem():
+def init_cs_uri_stem(rand=random):
     rng = WeightedChoice(["/Python-Release.png",
                           "/Javascript-Master.png",
                           "/Book-3.png",
@@ -57,17 +66,17 @@ def init_cs_uri_stem():
                           "/Book-7.png",
                           "/Book-8.png",
                           "/Book-9.png",
-                          "/Book-10.png"], [0.3, 0.25, 0.15, 0.05, 0.05, 0.04, 0.04, 0.04, 0.04, 0.04, 0.04])
-    return rng.run
+                          "/Book-10.png"], [0.3, 0.25, 0.15, 0.05, 0.05, 0.04, 0.04, 0.04, 0.04, 0.04, 0.04], rng=rand)
+    return rng
 
 
-def init_sc_status():
+def init_sc_status(rand=random):
     """Return the HTTP status code (%s)."""
-    rng = WeightedChoice(["200", "404", "500", "301"], [0.9, 0.04, 0.02, 0.04])
-    return rng.run
+    rng = WeightedChoice(["200", "404", "500", "301"], [0.9, 0.04, 0.02, 0.04], rng=rand)
+    return rng
 
 
-def init_cs_referer():
+def init_cs_referer(rand=random):
     rng = WeightedChoice(["https://www.mydomain.com/page/Python-Release.png",
                           "https://www.mydomain.com/page/Javascript-Master.png",
                           "https://www.mydomain.com/page/Book-3.png",
@@ -78,128 +87,153 @@ def init_cs_referer():
                           "https://www.mydomain.com/page/Book-8.png",
                           "https://www.mydomain.com/page/Book-9.png",
                           "https://www.mydomain.com/page/Book-10.png"],
-                         [0.3, 0.25, 0.15, 0.05, 0.05, 0.04, 0.04, 0.04, 0.04, 0.04, 0.04])
-    return rng.run
+                         [0.3, 0.25, 0.15, 0.05, 0.05, 0.04, 0.04, 0.04, 0.04, 0.04, 0.04], rng=rand)
+    return rng
 
 
-def init_cs_user_agent():
-    user_agent = [faker.chrome(), faker.firefox(), faker.safari(), faker.internet_explorer(), faker.opera()]
-    rng = WeightedChoice(user_agent, [0.5, 0.3, 0.1, 0.05, 0.05])
-    return rng.run
+def init_cs_user_agent(rand=random, fake=None):
+    fake = get_faker() if fake is None else fake
+    user_agent = [fake.chrome(), fake.firefox(), fake.safari(), fake.internet_explorer(), fake.opera()]
+    rng = WeightedChoice(user_agent, [0.5, 0.3, 0.1, 0.05, 0.05], rng=rand)
+    return rng
 
 
 def init_cs_uri_query():
-    return lambda: "-"
+    return constant("-")
 
 
 def init_cs_cookie():
-    return lambda: "-"
+    return constant("-")
 
 
-def init_x_edge_result_type():
+def init_x_edge_result_type(rand=random):
     rng = WeightedChoice(["Hit", "RefreshHit", "Miss", "LimitExceeded", "CapacityExceeded ", "Error", "Redirect"],
-                         [0.7, 0.05, 0.15, 0.01, 0.01, 0.01, 0.07])
-    return rng.run
+                         [0.7, 0.05, 0.15, 0.01, 0.01, 0.01, 0.07], rng=rand)
+    return rng
 
 
-def init_x_edge_request_id():
-    return lambda: generate_random_str(56)
+def init_x_edge_request_id(rand=random):
+    return batched(lambda: generate_random_str(56, rand), lambda k: generate_random_strs(56, k, rand))
 
 
-def init_x_host_header():
+def init_x_host_header(rand=random):
     rng = WeightedChoice(["d111111abcdef8.cloudfront.net",
                           "d3nnlo1goc4bi6.cloudfront.net",
                           "d13456asdfqef8.cloudfront.net",
                           "dcasdis99234ds.cloudfront.net",
                           "zxcvtyu678543d.cloudfront.net",
-                          "dasdqwe3456sdf.cloudfront.net"])
-    return rng.run
+                          "dasdqwe3456sdf.cloudfront.net"], rng=rand)
+    return rng
 
 
-def init_cs_protocol():
+def init_cs_protocol(rand=random):
     rng = WeightedChoice(["https", "http", "ws", "wss"],
-                         [0.6, 0.2, 0.1, 0.1])
-    return rng.run
+                         [0.6, 0.2, 0.1, 0.1], rng=rand)
+    return rng
 
 
-def init_cs_bytes():
-    return lambda: float(random.gauss(1520.000, 40))
+def init_cs_bytes(rand=random):
+    return distributions.from_config("cs-bytes", float, rand)
 
 
-def init_time_taken():
-    return lambda: float(random.gauss(1.4, 0.3))
+def init_time_taken(rand=random):
+    return distributions.from_config("time-taken", float, rand)
 
 
 def init_x_forwarded_for():
-    return lambda: "-"
+    return constant("-")
 
 
-def init_ssl_protocol():
+def init_ssl_protocol(rand=random):
     rng = WeightedChoice(["TLSv1.3", "TLSv1.2", "TLSv1.1", "TLSv1"],
-                         [0.6, 0.2, 0.1, 0.1])
-    return rng.run
+                         [0.6, 0.2, 0.1, 0.1], rng=rand)
+    return rng
 
 
-def init_ssl_cipher():
+def init_ssl_cipher(rand=random):
     rng = WeightedChoice(["TLS_AES_128_GCM_SHA256", "TLS_AES_256_GCM_SHA384", "TLS_CHACHA20_POLY1305_SHA256"],
-                         [0.6, 0.2, 0.2])
-    return rng.run
+                         [0.6, 0.2, 0.2], rng=rand)
+    return rng
 
 
-def init_x_edge_response_result_type():
+def init_x_edge_response_result_type(rand=random):
     rng = WeightedChoice(["Hit", "RefreshHit", "Miss", "LimitExceeded", "CapacityExceeded ", "Error", "Redirect"],
-                         [0.7, 0.05, 0.15, 0.01, 0.01, 0.01, 0.07])
-    return rng.run
+                         [0.7, 0.05, 0.15, 0.01, 0.01, 0.01, 0.07], rng=rand)
+    return rng
 
 
-def init_cs_protocol_version():
+def init_cs_protocol_version(rand=random):
     rng = WeightedChoice(["HTTP/2.0", "HTTP/1.1", "HTTP/1.0", "HTTP/0.9"],
-                         [0.6, 0.2, 0.1, 0.1])
-    return rng.run
+                         [0.6, 0.2, 0.1, 0.1], rng=rand)
+    return rng
 
 
 def init_fle_status():
-    return lambda: "-"
+    return constant("-")
 
 
 def init_fle_encrypted_fields():
-    return lambda: "-"
+    return constant("-")
 
 
-def init_c_port():
-    return lambda: random.randint(1000, 16000)
+def init_c_port(rand=random):
+    return batched(lambda: rand.randint(1000, 16000),
+                   lambda k: rand.choices(range(1000, 16001), k=k))
 
 
-def init_time_to_first_byte():
-    return lambda: float(random.gauss(1.2, 0.3))
+def init_time_to_first_byte(rand=random):
+    return distributions.from_config("time-to-first-byte", float, rand)
 
 
-def init_x_edge_detailed_result_type():
+def init_x_edge_detailed_result_type(rand=random):
     rng = WeightedChoice(["Miss", "AbortedOrigin", "ClientCommError", "ClientGeoBlocked"],
-                         [0.9, 0.05, 0.03, 0.02])
-    return rng.run
+                         [0.9, 0.05, 0.03, 0.02], rng=rand)
+    return rng
 
 
 def init_sc_content_type():
-    return lambda: "image/png"
+    return constant("image/png")
 
 
-def init_sc_content_len():
-    return lambda: float(random.gauss(620752, 50000))
+def init_sc_content_len(rand=random):
+    return distributions.from_config("sc-content-len", float, rand)
 
 
 def init_sc_range_start():
-    return lambda: "-"
+    return constant("-")
 
 
 def init_sc_range_end():
-    return lambda: "-"
+    return constant("-")
+
+
+# Characters of the generated request ids, the duplicated G/g and missing J/j are kept on purpose.
+base_str = "ABCDEFGHIGKLMNOPQRSTUVWXYZabcdefghigklmnopqrstuvwxyz0123456789"
+
+# Random bytes below accepted_bytes map to base_str[byte % len(base_str)], the others are dropped so that every
+# character stays equally likely.
+accepted_bytes = 256 // len(base_str) * len(base_str)
+byte_table = bytes.maketrans(bytes(range(accepted_bytes)),
+                             (base_str * (accepted_bytes // len(base_str))).encode("ascii"))
+rejected_bytes = bytes(range(accepted_bytes, 256))
+
+
+def random_chars(size, rand=random):
+    """Return size random characters of base_str as a single string, drawn from blocks of random bytes."""
+    chars = b""
+    while len(chars) < size:
+        missing = size - len(chars)
+        # A few bytes more than expected, so that a second block is rarely needed
+        block = rand.randbytes(missing * 256 // accepted_bytes + 16)
+        chars += block.translate(byte_table, rejected_bytes)
+    return chars[:size].decode("ascii")
+
+
+def generate_random_str(length, rand=random):
+    return random_chars(length, rand)
 
 
-def generate_random_str(length):
-    random_str = ""
-    base_str = "ABCDEFGHIGKLMNOPQRSTUVWXYZabcdefghigklmnopqrstuvwxyz0123456789"
-    n = len(base_str) - 1
-    for i in range(length):
-        random_str += base_str[random.randint(0, n)]
-    return random_str
+def generate_random_strs(length, k, rand=random):
+    """Batch mode of generate_random_str, k strings cut from one block of random characters."""
+    chars = random_chars(length * k, rand)
+    return [chars[i:i + length] for i in range(0, length * k, length)]
@@ -0,0 +1,124 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+from util.writers import columnar_format
+
+
+def column_type(values):
+    """Return the Arrow type of a column of generated values, from its first value."""
+    value = values[0] if values else ""
+    if isinstance(value, bool):
+        return pyarrow.bool_()
+    if isinstance(value, int):
+        return pyarrow.int64()
+    if isinstance(value, float):
+        return pyarrow.float64()
+    return pyarrow.string()
+
+
+class ColumnarSink:
+    """Columnar output writing generated lines as Parquet row groups or an Arrow IPC file.
+
+    FakeLogs gives it whole columns (see LinePattern.create_columns with raw=True), so no line is ever formatted.
+    The schema is taken from the token keys of the pattern and the types of the first batch: int64 and float64 for
+    numeric tokens, timestamp[s] for the date tokens and string for the others. Columns are accumulated until
+    row_group_size rows are available, then written as one row group (or one record batch).
+
+    pyarrow is an optional dependency, it is only needed when a ColumnarSink is created.
+    """
+
+    def __init__(self, output, file_format=None, row_group_size=128 * 1024, compression="snappy"):
+        if pyarrow is None:
+            raise ValueError("Columnar output needs the pyarrow package")
+
+        self.output = output
+        self.file_format = file_format or (columnar_format(output) if isinstance(output, str) else None) or "parquet"
+        if self.file_format not in ("parquet", "arrow"):
+            raise ValueError("Unsupported columnar format '{}'".format(self.file_format))
+
+        self.row_group_size = row_group_size
+        self.compression = compression
+        self.schema = None
+        self.timestamp_keys = set()
+        self.writer = None
+        self.closed = False
+        self.pending = {}
+        self.pending_rows = 0
+        self.rows = 0
+        self.row_groups = 0
+
+    def write_columns(self, columns, timestamp_keys=()):
+        """Queue columns of equal length, full row groups are written. Return the Arrow size of the written rows."""
+        if self.schema is None:
+            self.schema = pyarrow.schema([
+                (key, pyarrow.timestamp("s") if key in timestamp_keys else column_type(values))
+                for key, values in columns.items()])
+            self.timestamp_keys = set(timestamp_keys)
+
+        num_rows = 0
+        for key, values in columns.items():
+            if key in self.timestamp_keys:
+                values = [int(seconds) for seconds in values]
+            self.pending.setdefault(key, []).extend(values)
+            num_rows = len(values)
+        self.pending_rows += num_rows
+
+        size = 0
+        while self.pending_rows >= self.row_group_size:
+            size += self._write_row_group(self.row_group_size)
+        return size
+
+    def _write_row_group(self, num_rows):
+        arrays = []
+        for field in self.schema:
+            values = self.pending[field.name]
+            arrays.append(pyarrow.array(values[:num_rows], field.type))
+            del values[:num_rows]
+        table = pyarrow.Table.from_arrays(arrays, schema=self.schema)
+        self.pending_rows -= num_rows
+
+        self._open_writer()
+        if self.file_format == "parquet":
+            self.writer.write_table(table, row_group_size=num_rows)
+        else:
+            self.writer.write_table(table, max_chunksize=num_rows)
+        self.rows += num_rows
+        self.row_groups += 1
+        return table.nbytes
+
+    def _open_writer(self):
+        if self.writer is not None:
+            return
+        if self.file_format == "parquet":
+            self.writer = pyarrow.parquet.ParquetWriter(self.output, self.schema, compression=self.compression)
+        else:
+            self.writer = pyarrow.ipc.new_file(self.output, self.schema)
+
+    def flush(self):
+        """Row groups are only written once full, flush() leaves the pending rows to the next ones."""
+
+    def close(self):
+        if self.closed:
+            return
+
+        if self.pending_rows:
+            self._write_row_group(self.pending_rows)
+        if self.schema is not None:
+            self._open_writer()
+            self.writer.close()
+        self.closed = True
+
+    def abort(self):
+        """Drop the pending rows, the row groups already written are kept in a valid file."""
+        self.pending = {}
+        self.pending_rows = 0
+        self.close()
+
+    def stats(self):
+        return {"format": self.file_format, "rows": self.rows, "row_groups": self.row_groups}
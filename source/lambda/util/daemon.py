@@ -0,0 +1,228 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""Long-running generation of many log files from one process, e.g. for Fluent Bit to tail.
+
+    python -m util.daemon --stream path=/var/log/app/access.log,format=nginx,rate=200,max_bytes=50M \\
+                          --stream path=/var/log/app/cdn.log,format=cloudfront,rate=20
+    python -m util.daemon --config streams.json
+
+A JSON configuration holds {"streams": [{"path": ..., "format": ..., "rate": ...}, ...]}, each stream may also set
+name, pattern, max_bytes, backups, codec and flush_interval.
+"""
+
+import argparse
+import datetime
+import heapq
+import json
+import signal
+import sys
+import time
+import util.faker_config as config
+from util.line_pattern import LinePattern
+from util.log_generator import FakeLogs
+from util.log_generator import rate_tick
+from util.pacing import RateLimiter
+from util.tools import derive_seed
+
+# Multipliers of the size suffixes accepted by parse_size()
+size_units = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+
+
+def parse_size(value):
+    """Parse a size in bytes, with an optional K, M or G suffix (e.g. 50M), None means no limit."""
+    if value is None or isinstance(value, int):
+        return value
+    text = str(value).strip().upper().rstrip("B")
+    unit = text[-1:] if text[-1:] in size_units else ""
+    try:
+        return int(float(text[:len(text) - len(unit)]) * size_units[unit])
+    except ValueError:
+        raise ValueError('Invalid size "{}", expected bytes or e.g. 512K, 50M, 1G'.format(value))
+
+
+class LogStream:
+    """One output of the daemon: a FakeLogs writing lines dated now, at its own rate.
+
+    The file is rotated once max_bytes uncompressed bytes are written: it is renamed to <path>.1 and at most backups
+    rotated files are kept. Lines are written in micro-batches of rate_tick seconds and flushed every flush_interval
+    secs, the scheduler decides when through tick() and next_tick().
+    """
+
+    def __init__(self, path, rate, file_format="elf", pattern=None, name=None, max_bytes=None, backups=None,
+                 codec=None, flush_interval=1.0, seed=None, clock=time.monotonic):
+        if rate <= 0:
+            raise ValueError("The rate of stream {} must be positive".format(name or path))
+
+        self.name = path if name is None else name
+        self.path = path
+        self.rate = rate
+        self.flush_interval = flush_interval
+        self.micro_batch = max(1, int(rate * rate_tick))
+        # A late stream catches up one micro-batch per tick, so that it does not hold back the others
+        self.limiter = RateLimiter(rate, burst=self.micro_batch, clock=clock)
+        self.last_flush = None
+        self.rotations = 0
+
+        line_pattern = LinePattern(pattern, date_pattern=config.date_patterns.get(file_format), file_format=file_format,
+                                   seed=seed, date=datetime.datetime.now())
+        # Timestamps follow the wall clock, line i is due and dated i / rate seconds after the start
+        line_pattern.sleep = 1 / rate
+        self.fake_logs = FakeLogs(path, num_lines=0, line_pattern=line_pattern, codec=codec,
+                                  rotate_bytes=config.daemon_max_bytes if max_bytes is None else max_bytes,
+                                  backups=config.daemon_backups if backups is None else backups)
+
+    def tick(self, now):
+        """Write the lines due at the given clock time, flush when flush_interval elapsed. Return the lines."""
+        due = self.limiter.poll(now, self.micro_batch)
+        written = 0
+        closed_files = len(self.fake_logs.writer_stats)
+        while written < due:
+            written += self.fake_logs.write(due - written)
+        self.rotations += len(self.fake_logs.writer_stats) - closed_files
+
+        if self.last_flush is None or now - self.last_flush >= self.flush_interval:
+            self.fake_logs.file.flush()
+            self.last_flush = now
+        return written
+
+    def next_tick(self, now):
+        """Return the clock time of the next micro-batch."""
+        return max(self.limiter.next_due(self.micro_batch), now)
+
+    def close(self):
+        self.fake_logs.close()
+
+    def stats(self):
+        stats = self.limiter.stats()
+        stats.update(name=self.name, path=self.path, bytes=self.fake_logs.total_bytes, rotations=self.rotations)
+        return stats
+
+
+class LogDaemon:
+    """Run many LogStream from one thread.
+
+    Streams are kept in a heap ordered by the clock time of their next micro-batch, the scheduler sleeps until the
+    first one is due, writes it and pushes it back. Slow streams cost nothing between their lines. A stream falling
+    behind writes at most one micro-batch per tick and is pushed back behind the other due streams, so it delays
+    them by at most one micro-batch while it catches up.
+    """
+
+    def __init__(self, streams, clock=time.monotonic, sleep=time.sleep):
+        if not streams:
+            raise ValueError("The daemon needs at least one stream")
+
+        self.streams = streams
+        self.clock = clock
+        self.sleep = sleep
+
+    def run(self, duration=None):
+        """Generate until duration secs elapsed (forever by default), then close every stream."""
+        start = self.clock()
+        stop = None if duration is None else start + duration
+        heap = [(start, index) for index in range(len(self.streams))]
+        heapq.heapify(heap)
+        try:
+            while True:
+                due, index = heapq.heappop(heap)
+                if stop is not None and due >= stop:
+                    break
+                now = self.clock()
+                if due > now:
+                    self.sleep(due - now)
+                    now = self.clock()
+
+                stream = self.streams[index]
+                stream.tick(now)
+                heapq.heappush(heap, (stream.next_tick(now), index))
+        finally:
+            for stream in self.streams:
+                stream.close()
+
+    def stats(self):
+        return [stream.stats() for stream in self.streams]
+
+
+def parse_stream(spec):
+    """Parse a --stream option, comma separated key=value pairs, e.g. path=app.log,format=nginx,rate=100"""
+    stream = {}
+    for item in spec.split(","):
+        key, sep, value = item.partition("=")
+        if not sep:
+            raise ValueError('Invalid stream option "{}", expected key=value'.format(item))
+        stream[key.strip()] = value.strip()
+    return stream
+
+
+def create_stream(stream, seed=None):
+    """Return the LogStream of a stream configuration (a dict of the JSON configuration or of a --stream)."""
+    stream = dict(stream)
+    unknown = set(stream) - {"name", "path", "format", "pattern", "rate", "max_bytes", "backups", "codec",
+                             "flush_interval"}
+    if unknown:
+        raise ValueError("Unknown stream settings: {}".format(", ".join(sorted(unknown))))
+    if "path" not in stream or "rate" not in stream:
+        raise ValueError("Every stream needs a path and a rate")
+
+    backups = stream.get("backups")
+    return LogStream(stream["path"], float(stream["rate"]), file_format=stream.get("format", "elf"),
+                     pattern=stream.get("pattern"), name=stream.get("name"),
+                     max_bytes=parse_size(stream.get("max_bytes")),
+                     backups=int(backups) if backups is not None else None, codec=stream.get("codec"),
+                     flush_interval=float(stream.get("flush_interval", 1.0)),
+                     seed=None if seed is None else derive_seed(seed, stream.get("name", stream["path"])))
+
+
+def print_stream_stats(streams_stats):
+    """Print the lines, rate and rotations of each stream on stderr."""
+    for stats in streams_stats:
+        print("%s: wrote %d lines (%d bytes) in %f secs, %.1f lines/sec for a target of %.1f lines/sec, "
+              "%d rotations (max lag %f secs)"
+              % (stats["name"], stats["lines"], stats["bytes"], stats["elapsed"], stats["achieved_rate"],
+                 stats["target_rate"], stats["rotations"], stats["max_lag"]), file=sys.stderr)
+
+
+def main(argv=None):
+    """Command line entrypoint of the daemon mode."""
+    parser = argparse.ArgumentParser(description="Write fake logs to many files at their own rates.")
+    parser.add_argument("--config", help="JSON configuration, {\"streams\": [{\"path\": ..., \"rate\": ...}]}")
+    parser.add_argument("--stream", action="append", default=[],
+                        help="stream as key=value pairs: path, rate, format, pattern, name, max_bytes (e.g. 50M), "
+                             "backups, codec, flush_interval")
+    parser.add_argument("--duration", type=float, help="seconds to run (default: until interrupted)")
+    parser.add_argument("--seed", type=int, help="seed of the generated values")
+    args = parser.parse_args(argv)
+
+    configs = []
+    if args.config is not None:
+        try:
+            with open(args.config) as f:
+                streams = json.load(f)
+        except (OSError, ValueError) as e:
+            parser.error("invalid --config {}: {}".format(args.config, e))
+        streams = streams.get("streams") if isinstance(streams, dict) else None
+        if not isinstance(streams, list) or not all(isinstance(stream, dict) for stream in streams):
+            parser.error('invalid --config {}: expected {{"streams": [{{"path": ..., "rate": ...}}, ...]}}'
+                         .format(args.config))
+        configs.extend(streams)
+    try:
+        configs.extend(parse_stream(spec) for spec in args.stream)
+        if not configs:
+            parser.error("at least one --stream or a --config is needed")
+        streams = [create_stream(stream, args.seed) for stream in configs]
+    except ValueError as e:
+        parser.error(str(e))
+
+    # Pods are stopped with SIGTERM, streams are closed (and flushed) as with Ctrl-C
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    daemon = LogDaemon(streams)
+    try:
+        daemon.run(args.duration)
+    except KeyboardInterrupt:
+        print("Goodbye!")
+    finally:
+        print_stream_stats(daemon.stats())
+
+
+if __name__ == "__main__":
+    main()
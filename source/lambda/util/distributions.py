@@ -0,0 +1,101 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import random
+import util.faker_config as config
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def python_sampler(name, params, rand):
+    """Return sample(k) drawing k values with the random module (or a random.Random)."""
+    if name == "gauss":
+        mu, sigma = params
+        gauss = rand.gauss
+        return lambda k: [gauss(mu, sigma) for _ in range(k)]
+    if name == "lognormal":
+        mu, sigma = params
+        lognormvariate = rand.lognormvariate
+        return lambda k: [lognormvariate(mu, sigma) for _ in range(k)]
+    if name == "pareto":
+        alpha, scale = params
+        paretovariate = rand.paretovariate
+        return lambda k: [scale * paretovariate(alpha) for _ in range(k)]
+    raise ValueError("Unsupported distribution '{}'".format(name))
+
+
+def numpy_sampler(name, params, rand):
+    """Return sample(k) drawing k values into a NumPy array, the generator is seeded from rand."""
+    generator = numpy.random.default_rng(rand.getrandbits(64))
+    if name == "gauss":
+        mu, sigma = params
+        return lambda k: generator.normal(mu, sigma, k)
+    if name == "lognormal":
+        mu, sigma = params
+        return lambda k: generator.lognormal(mu, sigma, k)
+    if name == "pareto":
+        alpha, scale = params
+        # NumPy draws the Lomax distribution, shifted by one it is the Pareto distribution of paretovariate()
+        return lambda k: (generator.pareto(alpha, k) + 1) * scale
+    raise ValueError("Unsupported distribution '{}'".format(name))
+
+
+def numpy_enabled():
+    """Return True when samples are drawn with NumPy, opt-in with faker_config.numpy_distributions."""
+    return numpy is not None and config.numpy_distributions
+
+
+class Distribution:
+    """Token drawing numbers from a distribution, through a pool of samples refilled in bulk.
+
+    Supported distributions, with their parameters:
+        gauss      (mu, sigma)
+        lognormal  (mu, sigma) of the underlying normal distribution
+        pareto     (alpha, scale), values are scale or above
+    Samples are drawn pool_size at a time, with NumPy when enabled (see numpy_enabled()), and converted with convert
+    (int truncates like int(random.gauss(...)) did). Without NumPy, a seeded rand gives the same values everywhere.
+    """
+
+    __slots__ = ("name", "params", "convert", "pool_size", "vectorized", "sample", "_next")
+
+    def __init__(self, name, params, convert=float, rand=random, pool_size=4096):
+        self.name = name
+        self.params = tuple(params)
+        self.convert = convert
+        self.pool_size = pool_size
+        self.vectorized = numpy_enabled()
+        self.sample = numpy_sampler(name, self.params, rand) if self.vectorized else \
+            python_sampler(name, self.params, rand)
+        self._next = iter(()).__next__
+
+    def _draw(self, k):
+        samples = self.sample(k)
+        if self.vectorized:
+            samples = samples.astype(numpy.int64) if self.convert is int else samples
+            samples = samples.tolist()
+            if self.convert in (int, float):
+                return samples
+        return list(map(self.convert, samples))
+
+    def run(self):
+        """Get a random value."""
+        try:
+            return self._next()
+        except StopIteration:
+            self._next = iter(self._draw(self.pool_size)).__next__
+            return self._next()
+
+    __call__ = run
+
+    def run_many(self, k):
+        """Get a list of k random values, the pool is left for run()."""
+        return self._draw(k)
+
+
+def from_config(key, convert=float, rand=random):
+    """Return the Distribution configured for a token in faker_config.distributions."""
+    name, params = config.distributions[key]
+    return Distribution(name, params, convert, rand)
@@ -2,75 +2,137 @@
 # SPDX-License-Identifier: MIT-0
 
 import datetime
-import ipaddress
+import itertools
 import random
-from faker import Faker
-from tzlocal import get_localzone
+from util.tools import IPPool
 from util.tools import WeightedChoice
+from util.tools import batched
+from util.tools import constant
+from util.tools import derive_seed
+from util.tools import run_many
+from util.timestamp import TimestampFormatter
+from util.timestamp import from_seconds
+from util.timestamp import to_seconds
 import util.cloudfront_faker as cloudfront_faker
+import util.distributions as distributions
 import util.faker_config as config
 
 
+class LazyDispatcher(dict):
+    """Dict of tokens, a token registered with a factory is only built the first time its key is looked up.
+
+    build(key, factory) builds a token. factories may be shared with other dispatchers, it is copied before a
+    factory is registered.
+    """
+
+    __slots__ = ("build", "factories", "shared")
+
+    def __init__(self, build, factories=None):
+        super().__init__()
+        self.build = build
+        self.factories = {} if factories is None else factories
+        self.shared = factories is not None
+
+    def register(self, key, factory):
+        if self.shared:
+            self.factories = dict(self.factories)
+            self.shared = False
+        self.factories[key] = factory
+        self.pop(key, None)
+
+    def __contains__(self, key):
+        return dict.__contains__(self, key) or key in self.factories
+
+    def __missing__(self, key):
+        token = self[key] = self.build(key, self.factories[key])
+        return token
+
+    def available(self):
+        """Return every key which can be looked up, built or not."""
+        return set(self.factories) | set(self.keys())
+
+
 class FakeTokens:
-    """List of methods to generate fake tokens."""
+    """List of methods to generate fake tokens.
+
+    Tokens are registered as factories and built on first use, so that a pattern only pays for the tokens it
+    contains. Faker, the client IP pool and the local timezone are also only loaded when a token needs them.
+
+    Without seed, tokens draw from the global random module and the Faker shared by the process. With a seed, they
+    draw from a private random.Random and a Faker instance, both seeded from it, so the same seed, date and pattern
+    always produce the same values.
+    """
+
+    __slots__ = ("seed", "rng", "_faker", "_ip_pool", "profiler", "cursor", "last_cursors", "dispatcher",
+                 "_date_pattern", "date_formatter", "sleep")
 
-    def __init__(self, faker=None, date=None, date_pattern="%d/%b/%Y:%H:%M:%S", sleep=None):
-        self.faker = Faker() if faker is None else faker
+    def __init__(self, faker=None, date=None, date_pattern="%d/%b/%Y:%H:%M:%S", sleep=None, profiler=None,
+                 seed=None):
+        self.seed = seed
+        self.rng = random if seed is None else random.Random(derive_seed(seed, "tokens"))
+        self._faker = faker
+        self._ip_pool = None
+        self.profiler = profiler
         self.otime = datetime.datetime.now() if date is None else date
-        self.dispatcher = {}
+        # Dates of the lines of the last batch, see inc_seconds_many()
+        self.last_cursors = None
+        self.dispatcher = LazyDispatcher(self._build_factory, self.token_factories)
         self.date_pattern = date_pattern
         self.sleep = sleep
-        self.ip_lists = self.generate_global_ip_list()
 
-        # Nginx & Apache Log
-        self.register_token("b", self.init_size_object())
-        self.register_token("d", self.init_date())
-        self.register_token("h", self.init_host())
-        self.register_token("m", self.init_method())
-        self.register_token("s", self.init_status_code())
-        self.register_token("u", self.init_user_agent())
-        self.register_token("v", self.init_server_name())
-        self.register_token("H", self.init_protocol())
-        self.register_token("R", self.init_referrer())
-        self.register_token("U", self.init_url_request())
-        self.register_token("Z", self.init_timezone())
+    @property
+    def faker(self):
+        """Faker instance, imported and created on first use."""
+        if self._faker is None and self.seed is None:
+            self._faker = cloudfront_faker.get_faker()
+        elif self._faker is None:
+            from faker import Faker
+            self._faker = Faker()
+            self._faker.seed_instance(derive_seed(self.seed, "faker"))
+        return self._faker
 
-        # CloudFront Log
-        self.register_token("timestamp", self.init_date())
-        self.register_token("x-edge-location", cloudfront_faker.init_x_edge_location())
-        self.register_token("sc-bytes", cloudfront_faker.init_sc_bytes())
-        self.register_token("c-ip", cloudfront_faker.init_c_ip(self.ip_lists))
-        self.register_token("cs-method", cloudfront_faker.init_cs_method())
-        self.register_token("cs-host", cloudfront_faker.init_cs_host())
-        self.register_token("cs-uri-stem", cloudfront_faker.init_cs_uri_stem())
-        self.register_token("sc-status", cloudfront_faker.init_sc_status())
-        self.register_token("cs-referer", cloudfront_faker.init_cs_referer())
-        self.register_token("cs-user-agent", cloudfront_faker.init_cs_user_agent())
-        self.register_token("cs-uri-query", cloudfront_faker.init_cs_uri_query())
-        self.register_token("cs-cookie", cloudfront_faker.init_cs_cookie())
-        self.register_token("x-edge-result-type", cloudfront_faker.init_x_edge_result_type())
-        self.register_token("x-edge-request-id", cloudfront_faker.init_x_edge_request_id())
-        self.register_token("x-host-header", cloudfront_faker.init_x_host_header())
-        self.register_token("cs-protocol", cloudfront_faker.init_cs_protocol())
-        self.register_token("cs-bytes", cloudfront_faker.init_cs_bytes())
-        self.register_token("time-taken", cloudfront_faker.init_time_taken())
-        self.register_token("x-forwarded-for", cloudfront_faker.init_x_forwarded_for())
-        self.register_token("ssl-protocol", cloudfront_faker.init_ssl_protocol())
-        self.register_token("ssl-cipher", cloudfront_faker.init_ssl_cipher())
-        self.register_token("x-edge-response-result-type", cloudfront_faker.init_x_edge_response_result_type())
-        self.register_token("cs-protocol-version", cloudfront_faker.init_cs_protocol_version())
-        self.register_token("fle-status", cloudfront_faker.init_fle_status())
-        self.register_token("fle-encrypted-fields", cloudfront_faker.init_fle_encrypted_fields())
-        self.register_token("c-port", cloudfront_faker.init_c_port())
-        self.register_token("time-to-first-byte", cloudfront_faker.init_time_to_first_byte())
-        self.register_token("x-edge-detailed-result-type", cloudfront_faker.init_x_edge_detailed_result_type())
-        self.register_token("sc-content-type", cloudfront_faker.init_sc_content_type())
-        self.register_token("sc-content-len", cloudfront_faker.init_sc_content_len())
-        self.register_token("sc-range-start", cloudfront_faker.init_sc_range_start())
-        self.register_token("sc-range-end", cloudfront_faker.init_sc_range_end())
+    @property
+    def ip_pool(self):
+        """Pool of client IPs, built on first use."""
+        if self._ip_pool is None:
+            self._ip_pool = self.generate_global_ip_pool()
+        return self._ip_pool
+
+    @property
+    def otime(self):
+        """Current date of the generated logs."""
+        return from_seconds(self.cursor)
+
+    @otime.setter
+    def otime(self, date):
+        """Move the date cursor, kept as seconds since timestamp.EPOCH."""
+        self.cursor = to_seconds(date)
+
+    @property
+    def date_pattern(self):
+        """Getter to retrieve 'date_pattern' attribute."""
+        return self._date_pattern
+
+    @date_pattern.setter
+    def date_pattern(self, date_pattern):
+        """Setter to update the timestamp formatter."""
+        self._date_pattern = date_pattern
+        self.date_formatter = TimestampFormatter(date_pattern)
 
     def register_token(self, key, method):
-        self.dispatcher.update({key: method})
+        self.dispatcher.update({key: self._build_token(key, method)})
+
+    def register_factory(self, key, factory, *args):
+        """Register a token built by factory(*args) the first time key is used."""
+        self.dispatcher.register(key, lambda tokens: factory(*args))
+
+    def _build_factory(self, key, factory):
+        return self._build_token(key, factory(self))
+
+    def _build_token(self, key, method):
+        if self.profiler is not None:
+            method = self.profiler.wrap(key, method)
+        return method
 
     def get_tokens(self, date_pattern=None):
         if date_pattern is not None:
@@ -80,32 +142,49 @@ class FakeTokens:
     def run_token(self, token):
         return self.dispatcher[token]()
 
+    def run_token_many(self, token, k):
+        """Batch mode of run_token, return a column of k values."""
+        return run_many(self.dispatcher[token], k)
+
     def inc_date(self):
-        sleep = self.sleep if self.sleep is not None else random.randint(-2, 0)
-        increment = datetime.timedelta(seconds=sleep)
-        self.otime += increment
+        self.inc_seconds()
         return self.otime
 
-    def generate_global_ip_list(self):
-        tmp_ip_list = []
-        global_ip_cidrs = config.global_ip_cidrs
-        for ip_cidr in global_ip_cidrs:
-            tmp_ip_list += [str(ip) for ip in ipaddress.IPv4Network(ip_cidr)]
-        return tmp_ip_list
+    def inc_seconds(self):
+        sleep = self.sleep if self.sleep is not None else self.rng.randint(-2, 0)
+        self.cursor += sleep
+        return self.cursor
+
+    def inc_seconds_many(self, k):
+        """Batch mode of inc_seconds, return the k successive cursors."""
+        steps = [self.sleep] * k if self.sleep is not None else self.rng.choices((-2, -1, 0), k=k)
+        cursors = list(itertools.accumulate(steps, initial=self.cursor))[1:]
+        if cursors:
+            self.cursor = cursors[-1]
+        self.last_cursors = cursors
+        return cursors
+
+    def generate_global_ip_pool(self):
+        return IPPool.from_regions(config.country_ip_cidrs, config.country_ip_weights, self.rng)
 
     # ----------------------------------------------
     def init_location(self):
-        rng = WeightedChoice(["HKG62-C2", "HKG62-C3", "HKG62-C4", "HKG62-C5"], [0.8, 0.1, 0.05, 0.05])
-        return rng.run
+        rng = WeightedChoice(["HKG62-C2", "HKG62-C3", "HKG62-C4", "HKG62-C5"], [0.8, 0.1, 0.05, 0.05], rng=self.rng)
+        return rng
 
     def init_date(self):
         """Return the date (%d)."""
 
         def get_date():
-            date = self.inc_date()
-            return date.strftime(self.date_pattern)
+            return self.date_formatter(self.inc_seconds())
 
-        return get_date
+        def get_dates(k):
+            return self.date_formatter.format_many(self.inc_seconds_many(k))
+
+        token = batched(get_date, get_dates)
+        # Seconds since timestamp.EPOCH instead of formatted dates, for typed outputs
+        token.raw_many = self.inc_seconds_many
+        return token
 
     def init_host(self):
         """Return the client IP address (%h)."""
@@ -113,12 +192,12 @@ class FakeTokens:
 
     def init_method(self):
         """Return the request method (%m)."""
-        rng = WeightedChoice(["GET", "POST", "DELETE", "PUT"], [0.8, 0.1, 0.05, 0.05])
-        return rng.run
+        rng = WeightedChoice(["GET", "POST", "DELETE", "PUT"], [0.8, 0.1, 0.05, 0.05], rng=self.rng)
+        return rng
 
     def init_protocol(self):
         """Return the request protocol (%H)."""
-        return lambda: "HTTP/1.0"
+        return constant("HTTP/1.0")
 
     def init_referrer(self):
         """Return the referrer HTTP request header (%R)."""
@@ -128,34 +207,86 @@ class FakeTokens:
         """Return the server name (%v)."""
         if servers is None:
             servers = ["example1", "example2"]
-        return lambda: random.choice(servers)
+        return batched(lambda: self.rng.choice(servers), lambda k: self.rng.choices(servers, k=k))
 
     def init_size_object(self):
         """Return the size of the object returning by the client (%b)."""
-        return lambda: int(random.gauss(5000, 50))
+        return distributions.from_config("b", int, self.rng)
 
     def init_status_code(self):
         """Return the HTTP status code (%s)."""
-        rng = WeightedChoice(["200", "404", "500", "301"], [0.9, 0.04, 0.02, 0.04])
-        return rng.run
+        rng = WeightedChoice(["200", "404", "500", "301"], [0.9, 0.04, 0.02, 0.04], rng=self.rng)
+        return rng
 
     def init_timezone(self):
         """Return the timezone (%Z)."""
+        from tzlocal import get_localzone
         timezone = datetime.datetime.now(get_localzone()).strftime("%z")
-        return lambda: timezone
+        return constant(timezone)
 
     def init_url_request(self, list_files=None):
         """Return the URL path requested (%U)."""
         if list_files is None:
             list_files = []
             for _ in range(0, 10):
-                list_files.append(self.faker.file_path(depth=random.randint(0, 2), category="text"))
+                list_files.append(self.faker.file_path(depth=self.rng.randint(0, 2), category="text"))
 
-        return lambda: random.choice(list_files)
+        return batched(lambda: self.rng.choice(list_files), lambda k: self.rng.choices(list_files, k=k))
 
     def init_user_agent(self):
         """Return the user-agent HTTP request header (%u)."""
         user_agent = [self.faker.chrome(), self.faker.firefox(), self.faker.safari(), self.faker.internet_explorer(),
                       self.faker.opera()]
-        rng = WeightedChoice(user_agent, [0.5, 0.3, 0.1, 0.05, 0.05])
-        return rng.run
+        rng = WeightedChoice(user_agent, [0.5, 0.3, 0.1, 0.05, 0.05], rng=self.rng)
+        return rng
+
+    # Factories of the built-in tokens, factory(fake_tokens) returns the token. They are shared by every instance,
+    # an instance only gets its own copy when register_factory() overrides one.
+    token_factories = {
+        # Nginx & Apache Log
+        "b": init_size_object,
+        "d": init_date,
+        "h": init_host,
+        "m": init_method,
+        "s": init_status_code,
+        "u": init_user_agent,
+        "v": init_server_name,
+        "H": init_protocol,
+        "R": init_referrer,
+        "U": init_url_request,
+        "Z": init_timezone,
+
+        # CloudFront Log
+        "timestamp": init_date,
+        "x-edge-location": lambda tokens: cloudfront_faker.init_x_edge_location(tokens.rng),
+        "sc-bytes": lambda tokens: cloudfront_faker.init_sc_bytes(tokens.rng),
+        "c-ip": lambda tokens: cloudfront_faker.init_c_ip(tokens.ip_pool),
+        "cs-method": lambda tokens: cloudfront_faker.init_cs_method(tokens.rng),
+        "cs-host": lambda tokens: cloudfront_faker.init_cs_host(tokens.rng),
+        "cs-uri-stem": lambda tokens: cloudfront_faker.init_cs_uri_stem(tokens.rng),
+        "sc-status": lambda tokens: cloudfront_faker.init_sc_status(tokens.rng),
+        "cs-referer": lambda tokens: cloudfront_faker.init_cs_referer(tokens.rng),
+        "cs-user-agent": lambda tokens: cloudfront_faker.init_cs_user_agent(tokens.rng, tokens.faker),
+        "cs-uri-query": lambda tokens: cloudfront_faker.init_cs_uri_query(),
+        "cs-cookie": lambda tokens: cloudfront_faker.init_cs_cookie(),
+        "x-edge-result-type": lambda tokens: cloudfront_faker.init_x_edge_result_type(tokens.rng),
+        "x-edge-request-id": lambda tokens: cloudfront_faker.init_x_edge_request_id(tokens.rng),
+        "x-host-header": lambda tokens: cloudfront_faker.init_x_host_header(tokens.rng),
+        "cs-protocol": lambda tokens: cloudfront_faker.init_cs_protocol(tokens.rng),
+        "cs-bytes": lambda tokens: cloudfront_faker.init_cs_bytes(tokens.rng),
+        "time-taken": lambda tokens: cloudfront_faker.init_time_taken(tokens.rng),
+        "x-forwarded-for": lambda tokens: cloudfront_faker.init_x_forwarded_for(),
+        "ssl-protocol": lambda tokens: cloudfront_faker.init_ssl_protocol(tokens.rng),
+        "ssl-cipher": lambda tokens: cloudfront_faker.init_ssl_cipher(tokens.rng),
+        "x-edge-response-result-type": lambda tokens: cloudfront_faker.init_x_edge_response_result_type(tokens.rng),
+        "cs-protocol-version": lambda tokens: cloudfront_faker.init_cs_protocol_version(tokens.rng),
+        "fle-status": lambda tokens: cloudfront_faker.init_fle_status(),
+        "fle-encrypted-fields": lambda tokens: cloudfront_faker.init_fle_encrypted_fields(),
+        "c-port": lambda tokens: cloudfront_faker.init_c_port(tokens.rng),
+        "time-to-first-byte": lambda tokens: cloudfront_faker.init_time_to_first_byte(tokens.rng),
+        "x-edge-detailed-result-type": lambda tokens: cloudfront_faker.init_x_edge_detailed_result_type(tokens.rng),
+        "sc-content-type": lambda tokens: cloudfront_faker.init_sc_content_type(),
+        "sc-content-len": lambda tokens: cloudfront_faker.init_sc_content_len(tokens.rng),
+        "sc-range-start": lambda tokens: cloudfront_faker.init_sc_range_start(),
+        "sc-range-end": lambda tokens: cloudfront_faker.init_sc_range_end(),
+    }
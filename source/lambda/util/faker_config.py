@@ -17,9 +17,61 @@ patterns = {
 # Preview time in minutes
 preview_time = 30
 
+# Distribution of the numeric tokens, see util.distributions: gauss (mu, sigma), lognormal (mu, sigma) of the
+# underlying normal distribution or pareto (alpha, scale). E.g. "time-taken": ("lognormal", (0.25, 0.4))
+distributions = {
+    "b": ("gauss", (5000, 50)),
+    "sc-bytes": ("gauss", (55000, 8000)),
+    "cs-bytes": ("gauss", (1520.000, 40)),
+    "time-taken": ("gauss", (1.4, 0.3)),
+    "time-to-first-byte": ("gauss", (1.2, 0.3)),
+    "sc-content-len": ("gauss", (620752, 50000)),
+}
+
+# Draw the numeric tokens with NumPy when it is installed: faster, but seeded output then depends on NumPy being
+# present, e.g. it differs from the Lambda function where NumPy is not in the layer.
+numpy_distributions = False
+
 log_lines = 10000
 
-output_name = "cloudfront_fake_log.gz"
+# Compiled line patterns kept between invocations of a warm Lambda container, least recently used ones are dropped
+pattern_cache_size = 8
+
+# Worker processes of the generator Lambda, 0 uses every available core
+workers = 0
+
+# Below this number of lines, generation stays in a single process
+shard_min_lines = 200000
+
+# Rotation of the generated files, None disables a limit. Rotated files are named like CloudFront logs:
+# <distribution_id>.YYYY-MM-DD-HH.<unique>.gz, in the directory of the output.
+rotate_lines = None
+rotate_bytes = None
+rotate_seconds = None
+distribution_id = "E1EXAMPLE2ABCD"
+
+# Compression of the generated files, None picks the codec from the output name and a speed oriented level
+codec = None
+compress_level = None
+
+# Size of the parts streamed to S3 with a multipart upload, at least 5 MiB
+s3_part_size = 16 * 1024 * 1024
+
+# Jobs of the generator API, see util.jobs. Jobs below fanout_min_lines run within the API request, which API Gateway
+# cuts after 29 secs (the slowest formats generate about 5k lines/sec). Larger jobs are split into sub-jobs of about
+# lines_per_invocation lines, each one run by its own asynchronous invocation of the function.
+max_job_lines = 100000000
+fanout_min_lines = 100000
+lines_per_invocation = 1000000
+max_invocations = 100
+
+# Daemon mode, see util.daemon: default size cap of each stream file before it is rotated (uncompressed bytes) and
+# number of rotated files kept next to it (<name>.1 to <name>.N)
+daemon_max_bytes = 50 * 1024 * 1024
+daemon_backups = 5
+
+# Date pattern of each log type, the others use the LinePattern default
+date_patterns = {"cloudfront": "%Y-%m-%d\t%H:%M:%S"}
 
 # US CIDR, count 100
 ip_cidr_us = ["23.148.64.0/28", "23.157.32.0/28", "23.165.96.0/28", "23.173.176.0/28", "23.182.16.0/28", "23.237.0.0/28", "28.0.0.0/28", "45.42.28.0/28", "45.116.168.0/28", "46.22.64.0/28", "52.124.32.0/28", "64.46.64.0/28", "64.224.248.0/28", "66.81.208.0/28", "66.212.64.0/28", "68.68.16.0/28", "69.196.192.0/28", "74.114.52.0/28", "76.76.11.0/28", "83.229.96.0/28", "89.34.78.0/28", "91.92.138.0/28", "92.119.44.0/28", "94.199.128.0/28", "103.70.38.0/28", "103.254.160.0/28", "104.193.108.0/28", "104.255.33.0/28", "128.0.60.0/28", "130.55.0.0/28", "132.192.0.0/28", "136.149.0.0/28", "138.43.208.0/28", "140.87.0.0/28", "142.54.0.0/28", "143.244.64.0/28", "146.71.96.0/28", "147.185.35.0/28", "149.75.0.0/28", "152.85.0.0/28", "156.45.0.0/28", "158.76.0.0/28", "159.229.0.0/28", "161.133.0.0/28", "162.212.240.0/28", "162.247.128.0/28", "164.49.0.0/28", "166.82.0.0/28", "168.151.56.0/28", "170.96.0.0/28", "172.99.32.0/28",
@@ -63,3 +115,20 @@ ip_cidr_kr = ["1.11.0.0/28", "58.120.0.0/28", "103.54.60.0/28", "103.241.76.0/28
 
 global_ip_cidrs = ip_cidr_us + ip_cidr_gb + ip_cidr_de + ip_cidr_cn + \
     ip_cidr_ca + ip_cidr_fr + ip_cidr_in + ip_cidr_jp + ip_cidr_br + ip_cidr_kr
+
+country_ip_cidrs = {
+    "US": ip_cidr_us,
+    "GB": ip_cidr_gb,
+    "DE": ip_cidr_de,
+    "CN": ip_cidr_cn,
+    "CA": ip_cidr_ca,
+    "FR": ip_cidr_fr,
+    "IN": ip_cidr_in,
+    "JP": ip_cidr_jp,
+    "BR": ip_cidr_br,
+    "KR": ip_cidr_kr,
+}
+
+# Share of client IPs per country, e.g. {"US": 0.5, "GB": 0.3, "JP": 0.2}.
+# None draws uniformly over every address of global_ip_cidrs.
+country_ip_weights = None
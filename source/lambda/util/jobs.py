@@ -0,0 +1,225 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""Generation jobs of the log generator API.
+
+A job is a JSON serializable dict: log type, number of lines, time window and compression. Large jobs are split into
+sub-jobs which an executor runs in parallel: LambdaExecutor invokes the function asynchronously for each one,
+LocalExecutor runs them in a local process pool.
+"""
+
+import datetime
+import json
+import math
+import os
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor
+import util.faker_config as config
+import util.writers as writers
+from util.line_pattern import get_line_pattern
+from util.line_pattern import preview_date
+from util.log_generator import FakeLogs
+from util.sharding import ShardedFakeLogs
+from util.sharding import default_date_step
+from util.sharding import split_lines
+
+log_types = ["cloudfront", "nginx", "apache"]
+
+# Extension of the generated files for each compression codec
+codec_suffixes = {"gzip": ".gz", "bz2": ".bz2", "xz": ".xz", "zstd": ".zst", "none": ".log"}
+
+
+def parse_date(value):
+    """Parse an ISO 8601 date, dates with a time zone are converted to naive UTC."""
+    if value is None:
+        return None
+    try:
+        date = datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except (AttributeError, ValueError):
+        raise ValueError('Invalid date "{}", expected ISO 8601 e.g. 2022-01-01T00:00:00'.format(value))
+    if date.tzinfo is not None:
+        date = date.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return date
+
+
+def parse_job(log_type, body=None):
+    """Validate the parameters of a request and return the job.
+
+    body may set lines, start and end (ISO 8601, the first line is dated start and the others are spread evenly
+    until end, excluded; end needs a start), compression (gzip, bz2, xz, zstd when the zstandard package is
+    installed, or none) and level (within the range of the codec, ignored without compression). Without start,
+    lines start preview_time minutes from now and go back in time.
+    """
+    body = body or {}
+    if log_type not in log_types:
+        raise ValueError('Unsupported log type "{}"'.format(log_type))
+
+    lines = body.get("lines", config.log_lines)
+    if not isinstance(lines, int) or isinstance(lines, bool) or not 0 < lines <= config.max_job_lines:
+        raise ValueError("lines must be an integer between 1 and {}".format(config.max_job_lines))
+
+    codec = body.get("compression", config.codec or "gzip")
+    if codec not in codec_suffixes:
+        raise ValueError('Unsupported compression "{}", expected one of {}'.format(codec, ", ".join(codec_suffixes)))
+    if codec == "zstd" and writers.zstandard is None:
+        raise ValueError('Compression "zstd" is not available, the zstandard package is not installed')
+
+    level = body.get("level", config.compress_level)
+    if level is not None and (not isinstance(level, int) or isinstance(level, bool)):
+        raise ValueError("level must be an integer")
+    if level is not None and codec in writers.level_ranges:
+        low, high = writers.level_ranges[codec]
+        if not low <= level <= high:
+            raise ValueError("level must be between {} and {} for {}".format(low, high, codec))
+
+    start = parse_date(body.get("start"))
+    end = parse_date(body.get("end"))
+    if end is not None and start is None:
+        raise ValueError("end needs a start")
+    if end is not None and end <= start:
+        raise ValueError("end must be after start")
+    if start is None:
+        start = preview_date()
+    return {
+        "job_id": uuid.uuid4().hex,
+        "log_type": log_type,
+        "lines": lines,
+        "start": start.isoformat(),
+        "end": end.isoformat() if end is not None else None,
+        "codec": codec,
+        "level": level,
+        "shard": 0,
+        "shards": 1,
+    }
+
+
+def job_step(job):
+    """Return the seconds between two lines of a job with a time window, None for the default random steps.
+
+    The lines of a window are dated start, start + step, ... so the last one is one step before end.
+    """
+    if job["end"] is None:
+        return None
+    return (parse_date(job["end"]) - parse_date(job["start"])).total_seconds() / job["lines"]
+
+
+def runs_async(job):
+    """Return True when a job is too large to run within the API request, see split_job()."""
+    return job["lines"] >= config.fanout_min_lines
+
+
+def split_job(job):
+    """Split a job into sub-jobs of about config.lines_per_invocation lines, a single one for smaller jobs.
+
+    Sub-job windows follow each other, like the shards of ShardedFakeLogs.
+    """
+    shards = min(config.max_invocations, math.ceil(job["lines"] / config.lines_per_invocation))
+    if shards <= 1:
+        return [job]
+
+    step = job_step(job)
+    start = parse_date(job["start"])
+    sub_jobs = []
+    offset = 0
+    for shard, lines in enumerate(split_lines(job["lines"], shards)):
+        sub_start = start + datetime.timedelta(seconds=(step if step is not None else default_date_step) * offset)
+        sub_end = sub_start + datetime.timedelta(seconds=step * lines) if step is not None else None
+        sub_jobs.append(dict(job, lines=lines, start=sub_start.isoformat(),
+                             end=sub_end.isoformat() if sub_end is not None else None, shard=shard, shards=shards))
+        offset += lines
+    return sub_jobs
+
+
+def job_filename(job):
+    """Return the output name of a job, e.g. nginx_fake_log.<job id>.003.gz for the 4th sub-job."""
+    name = "{}_fake_log.{}".format(job["log_type"], job["job_id"])
+    if job["shards"] > 1:
+        name += ".{:03d}".format(job["shard"])
+    return name + codec_suffixes[job["codec"]]
+
+
+def run_job(job, opener=None, output_dir=""):
+    """Generate a (sub-)job in this container, with worker processes when it is large enough. Return its files."""
+    filename = os.path.join(output_dir, job_filename(job))
+    date_pattern = config.date_patterns.get(job["log_type"])
+    start = parse_date(job["start"])
+    step = job_step(job)
+    if step is not None:
+        # The step is added before each line is dated, starting one step earlier puts the first line on start
+        start -= datetime.timedelta(seconds=step)
+    output_options = dict(rotate_lines=config.rotate_lines, rotate_bytes=config.rotate_bytes,
+                          rotate_seconds=config.rotate_seconds, distribution_id=config.distribution_id,
+                          codec=job["codec"], compress_level=job["level"])
+    workers = config.workers or os.cpu_count() or 1
+    if workers > 1 and job["lines"] >= config.shard_min_lines:
+        # Each worker writes its own file or object, named after filename with its shard number
+        return ShardedFakeLogs(filename, num_lines=job["lines"], file_format=job["log_type"],
+                               date_pattern=date_pattern, date=start, sleep=step, workers=workers, opener=opener,
+                               **output_options).run()
+
+    # Reused by the next invocations of a warm container, only the date cursor and step are changed
+    line_pattern = get_line_pattern(None, date_pattern=date_pattern, file_format=job["log_type"])
+    line_pattern.rebase(start)
+    line_pattern.sleep = step
+    fake_logs = FakeLogs(filename=filename, num_lines=job["lines"], line_pattern=line_pattern, opener=opener,
+                         **output_options)
+    fake_logs.run()
+    return fake_logs.filenames
+
+
+def shard_status(job, status, **details):
+    return dict({"shard": job["shard"], "lines": job["lines"], "status": status}, **details)
+
+
+class LambdaExecutor:
+    """Run sub-jobs as asynchronous invocations of a Lambda function, usually the calling one.
+
+    The function receives {"job": sub_job} and is expected to call run_job(). Statuses only tell whether the
+    invocation was accepted, the sub-jobs report their own completion.
+    """
+
+    def __init__(self, function_name, client=None, max_workers=16):
+        if client is None:
+            import boto3
+            client = boto3.client("lambda")
+        self.function_name = function_name
+        self.client = client
+        self.max_workers = max_workers
+
+    def _invoke(self, job):
+        try:
+            response = self.client.invoke(FunctionName=self.function_name, InvocationType="Event",
+                                          Payload=json.dumps({"job": job}).encode("utf-8"))
+        except Exception as e:
+            return shard_status(job, "failed", error=str(e))
+        return shard_status(job, "submitted" if response["StatusCode"] == 202 else "failed")
+
+    def submit(self, jobs):
+        """Invoke the function for every job, return the status of each one."""
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            return list(pool.map(self._invoke, jobs))
+
+
+class LocalExecutor:
+    """Run sub-jobs in a local process pool, a stand-in for LambdaExecutor outside of AWS Lambda.
+
+    submit() waits for every sub-job, files are written to output_dir (or through opener).
+    """
+
+    def __init__(self, output_dir="", opener=None, max_workers=None):
+        self.output_dir = output_dir
+        self.opener = opener
+        self.max_workers = max_workers
+
+    def submit(self, jobs):
+        """Run every job, return the status of each one."""
+        with ProcessPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = [pool.submit(run_job, job, self.opener, self.output_dir) for job in jobs]
+            statuses = []
+            for job, future in zip(jobs, futures):
+                try:
+                    statuses.append(shard_status(job, "done", files=future.result()))
+                except Exception as e:
+                    statuses.append(shard_status(job, "failed", error=str(e)))
+        return statuses
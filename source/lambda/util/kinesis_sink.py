@@ -0,0 +1,192 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import logging
+import random
+import time
+import uuid
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+KiB = 1024
+MiB = 1024 * KiB
+
+# Service limits of one PutRecordBatch (Firehose) or PutRecords (Data Streams) call.
+MAX_BATCH_RECORDS = 500
+MAX_BATCH_BYTES = 4 * MiB
+MAX_RECORD_BYTES = {"firehose": 1000 * KiB, "streams": MiB}
+# The partition key of a Data Streams record counts in its size, at most 256 characters.
+MAX_PARTITION_KEY_BYTES = 256
+
+
+def random_partition_key():
+    """Spread records uniformly over the shards of a stream."""
+    return uuid.uuid4().hex
+
+
+class KinesisSink:
+    """Text output delivering lines to a Kinesis Data Firehose delivery stream or a Kinesis data stream.
+
+    It can replace the file of FakeLogs (write, flush and close). Written lines are packed into records, one line
+    per record or aggregate_lines newline terminated lines per record, and records into PutRecordBatch or
+    PutRecords calls close to the 500 records / 4 MiB limits. When a call partially fails, only the failed records
+    are sent again, after an exponential backoff, at most max_retries times. Lines are never split, a line too large
+    for one record raises ValueError.
+
+    client is a boto3 firehose client for kind="firehose" and a kinesis client for kind="streams".
+    """
+
+    def __init__(self, client, stream_name, kind="firehose", aggregate_lines=1, max_retries=5, backoff=0.1,
+                 max_backoff=5.0, partition_key=random_partition_key, sleep=time.sleep, clock=time.monotonic):
+        if kind not in MAX_RECORD_BYTES:
+            raise ValueError("Unsupported kind '{}', expected firehose or streams".format(kind))
+        if aggregate_lines < 1:
+            raise ValueError("At least one line per record is needed")
+
+        self.client = client
+        self.stream_name = stream_name
+        self.kind = kind
+        self.aggregate_lines = aggregate_lines
+        self.max_record_bytes = MAX_RECORD_BYTES[kind]
+        # Room is kept for the partition key, which is only drawn once the record is complete
+        self.max_data_bytes = self.max_record_bytes - (MAX_PARTITION_KEY_BYTES if kind == "streams" else 0)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.partition_key = partition_key
+        self.sleep = sleep
+        self.clock = clock
+        self.closed = False
+        self.partial = ""
+        self.record_lines = []
+        self.record_size = 0
+        self.batch = []
+        self.batch_size = 0
+        self.start = None
+        self.lines = 0
+        self.records = 0
+        self.bytes = 0
+        self.puts = 0
+        self.retried_records = 0
+        self.seconds = 0.0
+
+    def write(self, text):
+        """Write text, only complete lines are sent, the rest waits for the next write."""
+        if self.start is None:
+            self.start = self.clock()
+        lines = (self.partial + text).split("\n")
+        self.partial = lines.pop()
+        self.write_lines(lines)
+        return len(text)
+
+    def write_lines(self, lines):
+        """Write a list of lines, without their newline."""
+        for line in lines:
+            data = line.encode("utf-8") + b"\n"
+            if len(data) > self.max_data_bytes:
+                raise ValueError("A line of {} bytes does not fit in a {} record of at most {} bytes".format(
+                    len(data), self.kind, self.max_data_bytes))
+            if self.record_lines and (len(self.record_lines) >= self.aggregate_lines or
+                                      self.record_size + len(data) > self.max_data_bytes):
+                self._end_record()
+            self.record_lines.append(data)
+            self.record_size += len(data)
+        self.lines += len(lines)
+
+    def _end_record(self):
+        data = b"".join(self.record_lines)
+        self.record_lines = []
+        self.record_size = 0
+        record = {"Data": data}
+        size = len(data)
+        if self.kind == "streams":
+            record["PartitionKey"] = self.partition_key()
+            size += len(record["PartitionKey"].encode("utf-8"))
+            if size > self.max_record_bytes:
+                raise ValueError("Partition keys must be at most {} bytes".format(MAX_PARTITION_KEY_BYTES))
+
+        if len(self.batch) >= MAX_BATCH_RECORDS or self.batch_size + size > MAX_BATCH_BYTES:
+            self._send_batch()
+        self.batch.append(record)
+        self.batch_size += size
+
+    def _put(self, records):
+        """Send records in a single call, return the records which failed."""
+        self.puts += 1
+        if self.kind == "firehose":
+            response = self.client.put_record_batch(DeliveryStreamName=self.stream_name, Records=records)
+            failed_count, results = response["FailedPutCount"], response["RequestResponses"]
+        else:
+            response = self.client.put_records(StreamName=self.stream_name, Records=records)
+            failed_count, results = response["FailedRecordCount"], response["Records"]
+
+        if not failed_count:
+            return []
+        return [record for record, result in zip(records, results) if "ErrorCode" in result]
+
+    def _send_batch(self):
+        if not self.batch:
+            return
+
+        start_time = self.clock()
+        records = self.batch
+        self.records += len(records)
+        self.bytes += sum(len(record["Data"]) for record in records)
+        self.batch = []
+        self.batch_size = 0
+
+        failed = self._put(records)
+        attempt = 0
+        while failed:
+            if attempt >= self.max_retries:
+                raise RuntimeError("{} records still failed after {} retries".format(len(failed), attempt))
+
+            # Full jitter, so that throttled writers do not retry in lockstep
+            self.sleep(random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt)))
+            attempt += 1
+            self.retried_records += len(failed)
+            failed = self._put(failed)
+        self.seconds += self.clock() - start_time
+
+    def flush(self):
+        """Send the pending records, a line which is not terminated yet stays pending."""
+        if self.record_lines:
+            self._end_record()
+        self._send_batch()
+
+    def close(self):
+        if self.closed:
+            return
+
+        if self.partial:
+            self.write("\n")
+        self.flush()
+        self.closed = True
+        stats = self.stats()
+        logger.info("Sent %d lines in %d records to %s %s with %d calls, %.1f records/sec"
+                    % (stats["lines"], stats["records"], self.kind, self.stream_name, stats["puts"],
+                       stats["records_per_sec"]))
+
+    def abort(self):
+        """Drop the pending lines, records already sent cannot be taken back."""
+        self.partial = ""
+        self.record_lines = []
+        self.record_size = 0
+        self.batch = []
+        self.batch_size = 0
+        self.closed = True
+
+    def stats(self):
+        """Return the lines, records and bytes sent, the number of calls and retries, and the records/sec."""
+        elapsed = self.clock() - self.start if self.start is not None else 0.0
+        return {
+            "lines": self.lines,
+            "records": self.records,
+            "bytes": self.bytes,
+            "puts": self.puts,
+            "retried_records": self.retried_records,
+            "seconds": self.seconds,
+            "elapsed": elapsed,
+            "records_per_sec": self.records / elapsed if elapsed > 0 else 0.0,
+        }
@@ -2,9 +2,82 @@
 # SPDX-License-Identifier: MIT-0
 
 import re
+import collections
 import datetime
+import functools
+import time
 import util.faker_config as config
 from util.fake_tokens import FakeTokens
+from util.profiler import ASSEMBLY
+from util.profiler import LINE
+from util.timestamp import TimestampFormatter
+from util.tools import is_constant
+from util.tools import run_many
+
+tokens_regex = re.compile(r"%([0-9a-zA-Z\-]{1,})")
+
+# Dates of the records of create_records(), ISO 8601 so that e.g. OpenSearch detects them as dates
+record_date_pattern = "%Y-%m-%dT%H:%M:%S"
+
+
+@functools.lru_cache(maxsize=128)
+def parse_pattern(pattern):
+    """Split a pattern into its literal parts and its token keys, literals always has one more item than keys."""
+    parts = tokens_regex.split(pattern)
+    return tuple(parts[0::2]), tuple(parts[1::2])
+
+
+@functools.lru_cache(maxsize=128)
+def compile_template(literals):
+    """Compile the literal parts of a line into specialized callables.
+
+    Return (make_line, format_row): make_line(*tokens) builds a function generating a whole line from the token
+    callables, format_row(*values) formats a line from already generated values. Both are a single f-string, so
+    there is neither per-line list allocation nor format string parsing.
+    """
+    names = ["t{}".format(i) for i in range(len(literals) - 1)]
+
+    def f_string(placeholder):
+        body = literals[0].replace("{", "{{").replace("}", "}}")
+        for name, literal in zip(names, literals[1:]):
+            body += "{" + placeholder.format(name) + "}" + literal.replace("{", "{{").replace("}", "}}")
+        return "f" + repr(body)
+
+    args = ", ".join(names)
+    make_line = eval("lambda {}: lambda: {}".format(args, f_string("{}()")), {})
+    format_row = eval("lambda {}: {}".format(args, f_string("{}")), {})
+    return make_line, format_row
+
+
+def preview_date():
+    """Date of the first generated line, preview_time minutes from now."""
+    return datetime.datetime.now() + datetime.timedelta(minutes=config.preview_time)
+
+
+# LinePattern instances by (file_format, pattern, date_pattern), see get_line_pattern()
+line_patterns = collections.OrderedDict()
+
+
+def get_line_pattern(pattern=None, date_pattern=None, file_format="elf"):
+    """Return a cached LinePattern with its date cursor rebased to preview_date().
+
+    A warm Lambda container reuses the compiled pattern and its token tables across invocations instead of
+    rebuilding them. At most config.pattern_cache_size patterns are kept, clear_line_patterns() empties the cache.
+    """
+    cache_key = (file_format, pattern, date_pattern)
+    line_pattern = line_patterns.pop(cache_key, None)
+    if line_pattern is None:
+        line_pattern = LinePattern(pattern, date_pattern=date_pattern, file_format=file_format)
+    else:
+        line_pattern.rebase(preview_date())
+    line_patterns[cache_key] = line_pattern
+    while len(line_patterns) > config.pattern_cache_size:
+        line_patterns.popitem(last=False)
+    return line_pattern
+
+
+def clear_line_patterns():
+    line_patterns.clear()
 
 
 class LinePattern:
@@ -12,18 +85,19 @@ class LinePattern:
 
     patterns = config.patterns
 
-    def __init__(self, pattern=None, date_pattern=None, file_format="elf", fake_tokens=None):
+    def __init__(self, pattern=None, date_pattern=None, file_format="elf", fake_tokens=None, profiler=None,
+                 seed=None, date=None):
         self.pattern = self.get_default_format(pattern, file_format)
         self.date_pattern = "%d/%b/%Y:%H:%M:%S" if date_pattern is None else date_pattern
         self._sleep = None
-        self.fake_tokens = FakeTokens(date=(datetime.datetime.now() - datetime.timedelta(hours=0)
-                                            + datetime.timedelta(minutes=config.preview_time)))\
+        self.fake_tokens = FakeTokens(date=preview_date() if date is None else date, profiler=profiler, seed=seed) \
             if fake_tokens is None else fake_tokens
+        self.profiler = self.fake_tokens.profiler if profiler is None else profiler
         self.dispatcher = self.fake_tokens.get_tokens(self.date_pattern)
         self.tokens = []
-
-        tokens_regex = re.compile("%([0-9a-zA-Z\-]{1,})")
-        self.line = tokens_regex.sub(self.match_token, self.pattern)
+        self.keys = []
+        self.record_formatter = None
+        self.compile()
 
     def get_default_format(self, pattern=None, file_format="elf"):
         """Return a correct pattern (custom or relative a standard file format)."""
@@ -48,23 +122,75 @@ class LinePattern:
         self._sleep = sleep
         self.fake_tokens.sleep = sleep
 
-    def match_token(self, match):
-        """Register token."""
-        key = match.group(1)
-
-        if key not in self.dispatcher:
-            raise KeyError("Unsupported key '%{}'".format(key))
-
-        self.tokens.append(self.dispatcher[key])
-        return "{}"
+    def rebase(self, date):
+        """Move the date of the next generated line, the compiled tokens are kept."""
+        self.fake_tokens.otime = date
+
+    def compile(self):
+        """Register the tokens of the pattern and fold the constant ones into the line template."""
+        pattern_literals, keys = parse_pattern(self.pattern)
+        literals = [pattern_literals[0]]
+        self.slots = []
+        self.timestamp_keys = set()
+
+        for key, literal in zip(keys, pattern_literals[1:]):
+            if key not in self.dispatcher:
+                raise KeyError("Unsupported key '%{}'".format(key))
+
+            get_token = self.dispatcher[key]
+            if self.profiler is not None:
+                get_token = self.profiler.wrap(key, get_token)
+            self.tokens.append(get_token)
+            self.keys.append(key)
+            if hasattr(get_token, "raw_many"):
+                self.timestamp_keys.add(key)
+            if is_constant(get_token):
+                literals[-1] += format(get_token()) + literal
+            else:
+                self.slots.append(get_token)
+                literals.append(literal)
+
+        make_line, self._format_row = compile_template(tuple(literals))
+        self._create_line = make_line(*self.slots)
+        if self.profiler is not None:
+            self._create_line = self.profiler.timed(LINE, self._create_line)
 
     def __iter__(self):
         return iter(self.tokens)
 
     def create_line(self):
         """Format a line according to the pattern."""
-        values = []
-        for get_token in self:
-            values.append(get_token())
-
-        return self.line.format(*values)
+        return self._create_line()
+
+    def create_lines(self, num_lines):
+        """Format num_lines lines at once, each token producing its whole column in bulk."""
+        if not self.slots:
+            return [self._format_row()] * num_lines
+
+        columns = [run_many(get_token, num_lines) for get_token in self.slots]
+        if self.profiler is None:
+            return list(map(self._format_row, *columns))
+
+        start = time.perf_counter_ns()
+        lines = list(map(self._format_row, *columns))
+        self.profiler.record(ASSEMBLY, time.perf_counter_ns() - start, num_lines)
+        return lines
+
+    def create_columns(self, num_lines, raw=False):
+        """Generate num_lines lines as {token key: column of values}, no line is formatted.
+
+        With raw, the tokens listed in timestamp_keys give seconds since timestamp.EPOCH instead of formatted dates.
+        """
+        return {key: get_token.raw_many(num_lines) if raw and key in self.timestamp_keys
+                else run_many(get_token, num_lines) for key, get_token in zip(self.keys, self.tokens)}
+
+    def create_records(self, num_lines):
+        """Generate num_lines lines as dicts of {token key: value}, e.g. to index them as JSON documents.
+
+        The tokens listed in timestamp_keys give ISO 8601 dates (record_date_pattern) instead of their date_pattern.
+        """
+        if self.timestamp_keys and self.record_formatter is None:
+            self.record_formatter = TimestampFormatter(record_date_pattern)
+        columns = [self.record_formatter.format_many(get_token.raw_many(num_lines)) if key in self.timestamp_keys
+                   else run_many(get_token, num_lines) for key, get_token in zip(self.keys, self.tokens)]
+        return [dict(zip(self.keys, row)) for row in zip(*columns)]
@@ -2,23 +2,87 @@
 # SPDX-License-Identifier: MIT-0
 
 #!/usr/bin/python
-import gzip
+import argparse
+import datetime
+import itertools
+import math
 import os
+import random
 import signal
 import sys
 import time
+import uuid
+import util.faker_config as config
 from util.line_pattern import LinePattern
+from util.pacing import ProfileLimiter
+from util.pacing import RateLimiter
+from util.profiler import TokenProfiler
+from util.profiles import RateSeries
+from util.profiler import WRITE
+from util.timestamp import from_seconds
+from util.tools import derive_seed
+from util.writers import BulkWriter
+from util.writers import codec_from_filename
+from util.writers import columnar_format
+
+
+# Seconds of lines generated at once in rate mode.
+rate_tick = 0.05
+
+# Lines written before the average line size and date step are known, when rotating on bytes or generated time.
+probe_lines = 100
 
 
 class FakeLogs:
     """Entrypoint to generate fake logs (into file or stdout)."""
 
-    def __init__(self, filename=None, num_lines=10, file_format="elf", line_pattern=None, sleep=None):
+    def __init__(self, filename=None, num_lines=10, file_format="elf", line_pattern=None, sleep=None,
+                 batch_size=10000, opener=None, rotate_lines=None, rotate_bytes=None, rotate_seconds=None,
+                 distribution_id=None, rate=None, flush_interval=1.0, flush_bytes=1024 * 1024, codec=None,
+                 compress_level=None, profiler=None, seed=None, date=None, sink=None, backups=None,
+                 load_profile=None, backfill=False, rate_series=None, date_pattern=None):
         self.filename = filename
+        self.sink = sink
+        self.sink_stats = None
+        # Document sinks (e.g. util.opensearch_sink.OpenSearchSink) take lines as dicts instead of text, columnar
+        # sinks (util.columnar.ColumnarSink) take whole columns
+        self.documents = sink is not None and hasattr(sink, "write_records")
+        self.columnar = sink is not None and hasattr(sink, "write_columns")
+        self.codec = codec
+        self.compress_level = compress_level
+        self.writer_stats = []
+        self.rate = rate
+        # A util.profiles.LoadProfile drives the rate and the timestamps instead, see _write_profile()
+        self.load_profile = load_profile
+        self.backfill = backfill
+        self.rate_series = rate_series
+        self.flush_interval = flush_interval
+        self.flush_bytes = flush_bytes
+        self.opener = opener
+        self.rotate_lines = rotate_lines
+        self.rotate_bytes = rotate_bytes
+        self.rotate_seconds = rotate_seconds
+        self.distribution_id = config.distribution_id if distribution_id is None else distribution_id
+        # With backups, rotation keeps the output name and renames the full files, see _shift_backups()
+        self.backups = backups
+        self.rotate = filename is not None and sink is None and any(limit is not None for limit in
+                                                   (rotate_lines, rotate_bytes, rotate_seconds))
+        self.filenames = []
+        # With rotate_seconds, index of the time interval of the lines of the current file, see _write_intervals()
+        self.file_interval = None
+        # Unique part of the rotated file names, reproducible when seeded
+        self.name_rng = None if seed is None else random.Random(derive_seed(seed, "filenames"))
+        self.total_lines = 0
+        self.total_bytes = 0
         self.num_lines = num_lines
         self.sleep = sleep
-        self.line_pattern = LinePattern(file_format=file_format) if line_pattern is None else line_pattern
-        self.line_pattern.sleep = sleep
+        self.batch_size = batch_size
+        self.line_pattern = LinePattern(date_pattern=date_pattern, file_format=file_format, profiler=profiler,
+                                        seed=seed, date=date) if line_pattern is None else line_pattern
+        if sleep is not None:
+            # Otherwise the date step already set on the line pattern (e.g. by ShardedFakeLogs) is kept
+            self.line_pattern.sleep = sleep
+        self.profiler = self.line_pattern.profiler if profiler is None else profiler
 
         if self.num_lines < 0:
             sys.exit("The number of lines cannot be negative '^_^")
@@ -26,21 +90,192 @@ class FakeLogs:
         if self.sleep == 0 and self.num_lines == 0:
             sys.exit("Do not use --sleep=0 and --num=0 in the same time '^_^")
 
+        if self.rate is not None and (self.rate <= 0 or self.sleep is not None):
+            sys.exit("The rate must be positive and cannot be used with --sleep '^_^")
+
+        if self.load_profile is not None and (self.rate is not None or self.sleep is not None):
+            sys.exit("A load profile cannot be used with --rate or --sleep '^_^")
+
         self._init_file()
 
+    def rotated_filename(self):
+        """Return the next rotated file, named like CloudFront logs: <dist-id>.YYYY-MM-DD-HH.<unique>.gz
+
+        The date is the one of the lines of the file: the start of its interval with rotate_seconds, otherwise the
+        current date of the line pattern.
+        """
+        dirname, basename = os.path.split(self.filename)
+        ext = os.path.splitext(basename)[1]
+        date = self.line_pattern.fake_tokens.otime if self.file_interval is None else \
+            from_seconds(self.file_interval * self.rotate_seconds)
+        unique = uuid.uuid4().hex[:8] if self.name_rng is None else "{:08x}".format(self.name_rng.getrandbits(32))
+        name = "{}.{}.{}{}".format(self.distribution_id, date.strftime("%Y-%m-%d-%H"), unique, ext)
+        return os.path.join(dirname, name)
+
     def _init_file(self):
-        self.file = sys.stdout
-        if self.filename is not None:
-            dirname = os.path.dirname(self.filename)
+        """Open the output, opener(filename) may return any binary stream (e.g. util.s3_stream.S3MultipartWriter).
+
+        Files are written through a BulkWriter, compressed with codec (by default the one matching the extension).
+        A sink (e.g. util.kinesis_sink.KinesisSink) replaces the file, lines are then written to it directly.
+        """
+        self.file = sys.stdout if self.sink is None else self.sink
+        self.stream = None
+        self.file_lines = 0
+        self.file_bytes = 0
+        self.file_start = self.line_pattern.fake_tokens.cursor
+        if self.filename is None or self.sink is not None:
+            return
+        if self.rotate_seconds is not None and self.file_interval is None:
+            # Until the first line is written, the interval of the current date is the best guess
+            self.file_interval = self._interval(self.file_start)
+
+        filename = self.rotated_filename() if self.rotate and self.backups is None else self.filename
+        if self.opener is not None:
+            self.stream = self.opener(filename)
+        else:
+            dirname = os.path.dirname(filename)
             if dirname != "":
                 os.makedirs(dirname, exist_ok=True)
 
-            _open = gzip.open if self.filename.lower().endswith(".gz") else open
-            self.file = _open(self.filename, "wt")
+            self.stream = open(filename, "wb")
+
+        self.file_name = filename
+        codec = codec_from_filename(filename) if self.codec is None else self.codec
+        try:
+            self.file = BulkWriter(self.stream, codec, self.compress_level)
+        except Exception:
+            # e.g. a codec which is not installed, an empty object must not be published
+            if hasattr(self.stream, "abort"):
+                self.stream.abort()
+            else:
+                self.stream.close()
+            raise
+        if filename not in self.filenames:
+            self.filenames.append(filename)
 
     def _close_file(self):
-        if self.filename is not None:
+        if self.sink is not None:
+            self.sink.close()
+            self.sink_stats = self.sink.stats()
+            return
+        if self.filename is not None and not self.file.closed:
             self.file.close()
+            self.writer_stats.append(self.file.stats())
+        if self.stream is not None:
+            self.stream.close()
+
+    def _abort_file(self):
+        if self.sink is not None:
+            self.sink.abort()
+        elif self.stream is not None and hasattr(self.stream, "abort"):
+            self.stream.abort()
+        else:
+            self._close_file()
+
+    def _should_rotate(self):
+        """Return True once the current file reached its line or byte limit, time limits are handled by
+        _write_intervals()."""
+        if not self.rotate or self.file_lines == 0:
+            return False
+
+        return (self.rotate_lines is not None and self.file_lines >= self.rotate_lines) or \
+            (self.rotate_bytes is not None and self.file_bytes >= self.rotate_bytes)
+
+    def _rotate_if_needed(self):
+        if self._should_rotate():
+            self._rotate()
+
+    def _rotate(self):
+        self._close_file()
+        if self.backups is not None:
+            self._shift_backups()
+        self._init_file()
+
+    def _interval(self, cursor):
+        return int(cursor // self.rotate_seconds)
+
+    def _enter_interval(self, interval):
+        """Start the file of the lines of a new rotate_seconds interval."""
+        empty = self.file_lines == 0
+        self.file_interval = interval
+        if not empty:
+            self._rotate()
+        elif self.backups is None:
+            # The empty file was named after a guessed interval, it is replaced
+            self._discard_file()
+            self._init_file()
+
+    def _discard_file(self):
+        """Drop the current file, which has no line yet."""
+        self.filenames.remove(self.file_name)
+        if self.stream is not None and hasattr(self.stream, "abort"):
+            self.stream.abort()
+            return
+        self.file.close()
+        self.stream.close()
+        os.remove(self.file_name)
+
+    def _write_intervals(self, lines, cursors):
+        """Write text lines dated cursors, starting a new file whenever they enter a new rotate_seconds interval.
+
+        Intervals are aligned on timestamp.EPOCH, e.g. every file holds the lines of one hour with 3600.
+        """
+        offset = 0
+        for interval, group in itertools.groupby(cursors, self._interval):
+            size = sum(1 for _ in group)
+            if interval != self.file_interval:
+                self._enter_interval(interval)
+            text = "\n".join(lines[offset:offset + size]) + "\n"
+            self.file.write(text)
+            self._count(size, len(text))
+            offset += size
+
+    def _shift_backups(self):
+        """Rename the full file to <name>.1, the previous ones to <name>.2 and so on, the oldest is dropped.
+
+        Like logrotate, tailing agents (e.g. Fluent Bit) keep following the same output name. Local files only.
+        """
+        for index in range(self.backups - 1, 0, -1):
+            backup = "{}.{}".format(self.filename, index)
+            if os.path.exists(backup):
+                os.replace(backup, "{}.{}".format(self.filename, index + 1))
+        if self.backups > 0:
+            os.replace(self.filename, self.filename + ".1")
+        else:
+            os.remove(self.filename)
+
+    def _lines_before_rotation(self):
+        """Size the next batch from the average line so that the current file limits are not overshot."""
+        if not self.rotate:
+            return self.batch_size
+
+        lines = self.batch_size
+        if self.rotate_lines is not None:
+            lines = min(lines, self.rotate_lines - self.file_lines)
+        if self.rotate_bytes is not None:
+            lines = min(lines, self._estimate_lines(self.rotate_bytes - self.file_bytes, self.total_bytes))
+        return max(lines, 1)
+
+    def _estimate_lines(self, left, total):
+        """Return the number of lines expected to consume what is left of a limit, probing while nothing is known."""
+        if self.total_lines == 0:
+            return probe_lines
+        if total == 0:
+            return self.batch_size
+        return int(left * self.total_lines / total) + 1
+
+    def write(self, num_lines):
+        """Write up to num_lines lines now, rotating first when needed. Return the number of lines written.
+
+        For callers pacing the output themselves (e.g. util.daemon), close() ends the output.
+        """
+        self._rotate_if_needed()
+        num_lines = min(num_lines, self._lines_before_rotation())
+        self._write_lines(num_lines)
+        return num_lines
+
+    def close(self):
+        self._close_file()
 
     def run(self):
         """Main method to generate fake logs."""
@@ -48,8 +283,24 @@ class FakeLogs:
             self._write_line_and_sleep()
             return
 
-        for _ in range(0, self.num_lines):
-            self._write_line()
+        if self.rate is not None:
+            self._write_at_rate()
+            return
+
+        if self.load_profile is not None:
+            self._write_profile()
+            return
+
+        num_lines = self.num_lines
+        try:
+            while num_lines > 0:
+                self._rotate_if_needed()
+                batch_size = min(self._lines_before_rotation(), num_lines)
+                self._write_lines(batch_size)
+                num_lines -= batch_size
+        except BaseException:
+            self._abort_file()
+            raise
 
         self._close_file()
 
@@ -64,10 +315,356 @@ class FakeLogs:
         infinite = self.num_lines == 0
 
         while infinite or num_lines > 0:
+            self._rotate_if_needed()
             self._write_line(flush=True)
             time.sleep(self.sleep)
             num_lines -= 1
 
+    def _write_at_rate(self):
+        """Write lines in micro-batches paced by a RateLimiter, flushing every flush_interval secs or flush_bytes."""
+        limiter = RateLimiter(self.rate)
+
+        def report():
+            stats = limiter.stats()
+            print("Wrote %d lines in %f secs, %.1f lines/sec for a target of %.1f lines/sec (max lag %f secs)"
+                  % (stats["lines"], stats["elapsed"], stats["achieved_rate"], stats["target_rate"],
+                     stats["max_lag"]), file=sys.stderr)
+            return stats
+
+        def signal_handler(*_):
+            print("Goodbye!")
+            self._close_file()
+            report()
+            sys.exit(0)
+
+        signal.signal(signal.SIGINT, signal_handler)
+        num_lines = self.num_lines
+        infinite = self.num_lines == 0
+        micro_batch = max(1, min(self.batch_size, int(self.rate * rate_tick)))
+        last_flush = limiter.clock()
+        flushed_bytes = 0
+
+        while infinite or num_lines > 0:
+            self._rotate_if_needed()
+            limit = min(micro_batch, self._lines_before_rotation())
+            batch_size = limiter.acquire(limit if infinite else min(limit, num_lines))
+            self._write_lines(batch_size)
+            num_lines -= batch_size
+
+            now = limiter.clock()
+            if now - last_flush >= self.flush_interval or self.total_bytes - flushed_bytes >= self.flush_bytes:
+                self.file.flush()
+                last_flush = now
+                flushed_bytes = self.total_bytes
+
+        self._close_file()
+        self.rate_stats = report()
+
+    def _write_profile(self):
+        """Write lines following the load profile, num_lines 0 runs until the profile ends.
+
+        Lines are paced in real time by a ProfileLimiter, or generated at full speed with backfill. Either way,
+        line i is dated at the time the profile reaches i lines since the date of the line pattern, so the timestamp
+        density follows the profile too. The lines written per second (of wall clock, or of generated time with
+        backfill) are exported to the rate_series CSV file.
+        """
+        profile = self.load_profile
+        limiter = None if self.backfill else ProfileLimiter(profile)
+        times = profile.cursor()
+        # Lines due at the end of each second, so that backfill batches stay within one second
+        seconds = profile.cursor()
+        series = RateSeries()
+        start_date = self.line_pattern.fake_tokens.otime
+        start_cursor = self.line_pattern.fake_tokens.cursor
+
+        def report():
+            if limiter is None:
+                print("Wrote %d lines over %f secs of generated time" % (emitted, times.t), file=sys.stderr)
+                stats = None
+            else:
+                stats = limiter.stats()
+                print("Wrote %d lines in %f secs, %.1f lines/sec for a target of %.1f lines/sec (max lag %f secs)"
+                      % (stats["lines"], stats["elapsed"], stats["achieved_rate"], stats["target_rate"],
+                         stats["max_lag"]), file=sys.stderr)
+            if self.rate_series is not None:
+                series.write_csv(self.rate_series, profile, start_date)
+            return stats
+
+        def signal_handler(*_):
+            print("Goodbye!")
+            self._close_file()
+            report()
+            sys.exit(0)
+
+        signal.signal(signal.SIGINT, signal_handler)
+        emitted = 0
+        infinite = self.num_lines == 0
+        last_flush = time.monotonic()
+        flushed_bytes = 0
+
+        while infinite or emitted < self.num_lines:
+            first = times.time_at(emitted)
+            if first is None:
+                break
+
+            self._rotate_if_needed()
+            limit = min(self.batch_size, self._lines_before_rotation())
+            if not infinite:
+                limit = min(limit, self.num_lines - emitted)
+            if limiter is None:
+                second_end = math.ceil(seconds.lines_at(math.floor(first) + 1))
+                batch_size = max(1, min(limit, second_end - emitted))
+            else:
+                batch_size = limiter.acquire(max(1, min(limit, int(profile.rate(first) * rate_tick))))
+
+            last = times.time_at(emitted + batch_size)
+            step = ((last if last is not None else profile.duration) - first) / batch_size
+            self.line_pattern.sleep = step
+            # The date token moves the cursor by step before each line
+            self.line_pattern.fake_tokens.cursor = start_cursor + first - step
+            self._write_lines(batch_size)
+            emitted += batch_size
+
+            if limiter is None:
+                series.record(first, batch_size)
+                continue
+
+            now = limiter.clock()
+            series.record(now - limiter.start, batch_size, max(now - limiter.start - first, 0.0))
+            if now - last_flush >= self.flush_interval or self.total_bytes - flushed_bytes >= self.flush_bytes:
+                self.file.flush()
+                last_flush = now
+                flushed_bytes = self.total_bytes
+
+        self._close_file()
+        self.rate_stats = report()
+
     def _write_line(self, flush=False):
+        if self.documents or self.columnar or self.rotate_seconds is not None:
+            self._write_lines(1)
+            if flush:
+                self.file.flush()
+            return
+
         line = self.line_pattern.create_line()
+        # Only timed when profiling, this is the per line hot path
+        start = time.perf_counter_ns() if self.profiler is not None else 0
         print(line, file=self.file, flush=flush)
+        if self.profiler is not None:
+            self.profiler.record(WRITE, time.perf_counter_ns() - start)
+        self._count(1, len(line) + 1)
+
+    def _write_lines(self, num_lines):
+        if self.documents:
+            self._write_records(num_lines)
+            return
+        if self.columnar:
+            self._write_columns(num_lines)
+            return
+
+        lines = self.line_pattern.create_lines(num_lines)
+        cursors = self.line_pattern.fake_tokens.last_cursors
+        start = time.perf_counter_ns() if self.profiler is not None else 0
+        if self.rotate and self.rotate_seconds is not None and cursors is not None:
+            self._write_intervals(lines, cursors)
+        else:
+            text = "\n".join(lines) + "\n"
+            self.file.write(text)
+            self._count(num_lines, len(text))
+        if self.profiler is not None:
+            self.profiler.record(WRITE, time.perf_counter_ns() - start, num_lines)
+
+    def _write_records(self, num_lines):
+        records = self.line_pattern.create_records(num_lines)
+        start = time.perf_counter_ns() if self.profiler is not None else 0
+        num_bytes = self.file.write_records(records)
+        if self.profiler is not None:
+            self.profiler.record(WRITE, time.perf_counter_ns() - start, num_lines)
+        self._count(num_lines, num_bytes)
+
+    def _write_columns(self, num_lines):
+        columns = self.line_pattern.create_columns(num_lines, raw=True)
+        start = time.perf_counter_ns() if self.profiler is not None else 0
+        num_bytes = self.file.write_columns(columns, self.line_pattern.timestamp_keys)
+        if self.profiler is not None:
+            self.profiler.record(WRITE, time.perf_counter_ns() - start, num_lines)
+        self._count(num_lines, num_bytes)
+
+    def _count(self, num_lines, num_bytes):
+        self.file_lines += num_lines
+        self.file_bytes += num_bytes
+        self.total_lines += num_lines
+        self.total_bytes += num_bytes
+
+
+def print_writer_stats(writer_stats):
+    """Print the compression summary of written files on stderr."""
+    if not writer_stats:
+        return
+
+    raw_bytes = sum(stats["raw_bytes"] for stats in writer_stats)
+    compressed_bytes = sum(stats["compressed_bytes"] for stats in writer_stats)
+    seconds = sum(stats["seconds"] for stats in writer_stats)
+    print("Wrote %d files, %d bytes (%d raw) with %s level %s, %.1f compressed bytes/sec"
+          % (len(writer_stats), compressed_bytes, raw_bytes, writer_stats[0]["codec"], writer_stats[0]["level"],
+             compressed_bytes / seconds if seconds > 0 else 0.0), file=sys.stderr)
+
+
+def print_sink_stats(sink_stats):
+    """Print the delivery summary of a sink on stderr."""
+    if sink_stats is None:
+        return
+
+    if "row_groups" in sink_stats:
+        print("Wrote %d rows in %d row groups (%s)" % (sink_stats["rows"], sink_stats["row_groups"],
+                                                      sink_stats["format"]), file=sys.stderr)
+        return
+
+    if "docs" in sink_stats:
+        print("Indexed %d documents with %d bulk requests, %d throttled, %d errors, %.1f docs/sec, "
+              "latency p50 %.3f p90 %.3f p99 %.3f max %.3f secs"
+              % (sink_stats["docs"], sink_stats["requests"], sink_stats["throttled"], sink_stats["errors"],
+                 sink_stats["docs_per_sec"], sink_stats["latency_p50"], sink_stats["latency_p90"],
+                 sink_stats["latency_p99"], sink_stats["latency_max"]), file=sys.stderr)
+        return
+
+    print("Sent %d lines in %d records (%d bytes) with %d calls, %d records retried, %.1f records/sec"
+          % (sink_stats["lines"], sink_stats["records"], sink_stats["bytes"], sink_stats["puts"],
+             sink_stats["retried_records"], sink_stats["records_per_sec"]), file=sys.stderr)
+
+
+def open_sink(args):
+    """Return the sink selected on the command line, or None."""
+    if args.output is not None and columnar_format(args.output) is not None:
+        # Imports pyarrow, only paid for columnar outputs
+        from util.columnar import ColumnarSink
+        dirname = os.path.dirname(args.output)
+        if dirname != "":
+            os.makedirs(dirname, exist_ok=True)
+        return ColumnarSink(args.output, row_group_size=args.row_group_size)
+    if args.opensearch is not None:
+        from util.opensearch_sink import OpenSearchSink
+        return OpenSearchSink(args.opensearch, args.index, concurrency=args.concurrency)
+    if args.firehose is None and args.kinesis_stream is None:
+        return None
+
+    import boto3
+    from util.kinesis_sink import KinesisSink
+    if args.firehose is not None:
+        return KinesisSink(boto3.client("firehose"), args.firehose, "firehose", args.aggregate_lines)
+    return KinesisSink(boto3.client("kinesis"), args.kinesis_stream, "streams", args.aggregate_lines)
+
+
+def main(argv=None):
+    """Command line entrypoint, e.g. python -m util.log_generator -f cloudfront -n 1000000 -w 4 -o logs.gz"""
+    parser = argparse.ArgumentParser(description="Generate fake logs.")
+    parser.add_argument("-o", "--output", help="output file, .gz files are compressed, .parquet and .arrow files are "
+                                                "columnar (default: stdout)")
+    parser.add_argument("--row-group-size", type=int, default=128 * 1024, help="rows per Parquet row group")
+    parser.add_argument("-n", "--num", type=int, help="number of lines, 0 is infinite with --sleep or --rate and "
+                                                       "runs the whole --load-profile (default: 10, 0 with a profile)")
+    parser.add_argument("-f", "--format", default="elf", help="log format, e.g. cloudfront, elf, clf, nginx")
+    parser.add_argument("-s", "--sleep", type=float, help="seconds to wait between two lines")
+    parser.add_argument("-r", "--rate", type=float, help="target lines/sec, 0 lines with --num is infinite")
+    parser.add_argument("--load-profile", metavar="JSON", help="rate over time (ramps, diurnal curve, bursts, spikes), "
+                                                              "see util.profiles")
+    parser.add_argument("--backfill", action="store_true", help="generate a load profile at full speed, only the "
+                                                               "timestamps follow it")
+    parser.add_argument("--rate-series", metavar="CSV", help="export the target and realized lines/sec of a load "
+                                                            "profile, one row per second")
+    parser.add_argument("-c", "--codec", choices=["gzip", "bz2", "xz", "zstd", "none"],
+                        help="compression codec (default: from the output extension)")
+    parser.add_argument("-l", "--level", type=int, help="compression level (default: speed oriented)")
+    parser.add_argument("-w", "--workers", type=int, default=1, help="worker processes, 0 uses every core")
+    parser.add_argument("--no-merge", action="store_true", help="keep one output file per worker")
+    parser.add_argument("--rotate-lines", type=int, help="start a new file every N lines")
+    parser.add_argument("--rotate-bytes", type=int, help="start a new file every N uncompressed bytes")
+    parser.add_argument("--rotate-seconds", type=int, help="one file per N seconds of generated time, aligned on the "
+                                                               "epoch (e.g. 3600: one file per hour)")
+    parser.add_argument("--distribution-id", help="prefix of rotated files (default: faker_config.distribution_id)")
+    parser.add_argument("--profile", action="store_true", help="print the time spent per token on stderr")
+    parser.add_argument("--seed", type=int, help="seed of the generated values, the output is reproducible with --date")
+    parser.add_argument("--date", type=datetime.datetime.fromisoformat,
+                        help="date of the first line, e.g. 2022-01-01T00:00:00 (default: now + preview time)")
+    parser.add_argument("--upload", metavar="S3_URI", help="upload the output files to s3://bucket/prefix")
+    parser.add_argument("--firehose", metavar="NAME", help="send the lines to a Kinesis Data Firehose stream")
+    parser.add_argument("--kinesis-stream", metavar="NAME", help="send the lines to a Kinesis data stream")
+    parser.add_argument("--aggregate-lines", type=int, default=1, help="lines per Kinesis record")
+    parser.add_argument("--opensearch", metavar="URL", help="index the lines as JSON documents, e.g. https://host:443")
+    parser.add_argument("--index", default="fake-logs", help="OpenSearch index (default: fake-logs)")
+    parser.add_argument("--concurrency", type=int, default=4, help="concurrent OpenSearch bulk requests")
+    args = parser.parse_args(argv)
+    if args.num is None:
+        args.num = 0 if args.load_profile is not None else 10
+    if (args.backfill or args.rate_series is not None) and args.load_profile is None:
+        parser.error("--backfill and --rate-series need a --load-profile")
+    if args.upload is not None and (args.output is None or not args.upload.startswith("s3://")):
+        parser.error("--upload needs --output and an s3://bucket/prefix URI")
+    sinks = [option for option in (args.firehose, args.kinesis_stream, args.opensearch) if option is not None]
+    if len(sinks) > 1:
+        parser.error("--firehose, --kinesis-stream, --opensearch and columnar outputs cannot be used together")
+    columnar = args.output is not None and columnar_format(args.output) is not None
+    if columnar:
+        from util.columnar import pyarrow
+        if pyarrow is None:
+            parser.error(".parquet and .arrow outputs need the pyarrow package")
+        sinks.append(args.output)
+    if sinks and ((args.output is not None and not columnar) or args.workers != 1):
+        parser.error("--firehose, --kinesis-stream and --opensearch cannot be used with --output or --workers")
+    # Same timestamps as the Lambda function and the daemon, e.g. tab separated date and time for CloudFront
+    date_pattern = config.date_patterns.get(args.format)
+    rotation = dict(rotate_lines=args.rotate_lines, rotate_bytes=args.rotate_bytes,
+                    rotate_seconds=args.rotate_seconds, distribution_id=args.distribution_id)
+    compression = dict(codec=args.codec, compress_level=args.level)
+
+    load_profile = None
+    if args.load_profile is not None:
+        from util import profiles
+        try:
+            load_profile = profiles.load_profile(args.load_profile, args.seed)
+        except (KeyError, TypeError, ValueError) as e:
+            parser.error("invalid load profile: {}".format(e))
+
+    if args.workers == 1:
+        profiler = TokenProfiler() if args.profile else None
+        date = args.date
+        if date is None and load_profile is not None and not args.backfill:
+            # Paced in real time, the timestamps follow the wall clock
+            date = datetime.datetime.now()
+        fake_logs = FakeLogs(filename=args.output, num_lines=args.num, file_format=args.format, sleep=args.sleep,
+                             rate=args.rate, profiler=profiler, seed=args.seed, date=date, sink=open_sink(args),
+                             load_profile=load_profile, backfill=args.backfill, rate_series=args.rate_series,
+                             date_pattern=date_pattern, **rotation, **compression)
+        fake_logs.run()
+        # A columnar sink writes the output file itself
+        filenames = [args.output] if fake_logs.sink is not None and args.output is not None else fake_logs.filenames
+        print_writer_stats(fake_logs.writer_stats)
+        print_sink_stats(fake_logs.sink_stats)
+        if profiler is not None:
+            profiler.print_report()
+    elif args.output is None or args.sleep is not None or args.rate is not None or args.profile or \
+            load_profile is not None:
+        parser.error("--workers needs --output and cannot be used with --sleep, --rate, --profile or --load-profile")
+    else:
+        from util.sharding import ShardedFakeLogs
+        filenames = ShardedFakeLogs(args.output, num_lines=args.num, file_format=args.format,
+                                    date_pattern=date_pattern, workers=args.workers or None,
+                                    merge=not args.no_merge, seed=args.seed, date=args.date, **rotation,
+                                    **compression).run()
+
+    if args.upload is not None:
+        import boto3
+        from util.tools import upload_folder_to_s3
+        bucket, _, prefix = args.upload[len("s3://"):].partition("/")
+        # Only the files of this run, keyed by their path relative to the directory of the output
+        output_dir = os.path.dirname(os.path.abspath(args.output))
+        results = upload_folder_to_s3(boto3.resource("s3").Bucket(bucket), output_dir, prefix,
+                                      files=[os.path.abspath(filename) for filename in filenames])
+        uploaded = [result for result in results if not result["skipped"]]
+        print("Uploaded {} files ({} bytes) in {:f} secs, skipped {} files".format(
+            len(uploaded), sum(result["bytes"] for result in uploaded),
+            sum(result["seconds"] for result in uploaded), len(results) - len(uploaded)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import datetime
+import email.utils
+import json
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import urllib3
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+MiB = 1024 * 1024
+
+
+def percentile(sorted_values, fraction):
+    """Nearest rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(int(fraction * len(sorted_values)), len(sorted_values) - 1)]
+
+
+def retry_after(value):
+    """Return the secs to wait according to a Retry-After header (secs or an HTTP-date), None if unreadable."""
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=datetime.timezone.utc)
+    return max((date - datetime.datetime.now(datetime.timezone.utc)).total_seconds(), 0.0)
+
+
+class OpenSearchSink:
+    """Document output indexing generated lines into OpenSearch with the _bulk API.
+
+    FakeLogs gives it lines as dicts of {token key: value} (see LinePattern.create_records), each one becomes a
+    JSON document with its dates in ISO 8601, which OpenSearch maps as dates. Documents are packed into NDJSON _bulk requests of about bulk_bytes, sent by up to concurrency
+    threads over one pooled HTTP connection per thread. A request answered with 429 Too Many Requests is sent again
+    after a backoff (Retry-After when given), and so are the documents rejected with 429 inside a bulk response.
+    Other rejected documents are counted as errors, and so are the documents of a failed request (HTTP error or
+    still throttled after max_retries), whose error is raised by the next write_records(), flush() or close().
+    """
+
+    def __init__(self, url, index, bulk_bytes=5 * MiB, concurrency=4, auth=None, max_retries=8, backoff=0.2,
+                 max_backoff=10.0, timeout=60.0, verify=True, sleep=time.sleep, clock=time.monotonic):
+        self.url = url.rstrip("/") + "/" + index + "/_bulk"
+        self.bulk_bytes = bulk_bytes
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.sleep = sleep
+        self.clock = clock
+        self.headers = {"Content-Type": "application/x-ndjson"}
+        if auth is not None:
+            self.headers.update(urllib3.make_headers(basic_auth="{}:{}".format(*auth)))
+        self.http = urllib3.PoolManager(maxsize=concurrency, block=True, timeout=timeout,
+                                        cert_reqs="CERT_REQUIRED" if verify else "CERT_NONE")
+        self.executor = ThreadPoolExecutor(max_workers=concurrency)
+        self.in_flight = []
+        self.lock = threading.Lock()
+        self.closed = False
+        self.pending = []
+        self.pending_size = 0
+        self.start = None
+        self.docs = 0
+        self.bytes = 0
+        self.requests = 0
+        self.throttled = 0
+        self.errors = 0
+        self.latencies = []
+
+    def write_records(self, records):
+        """Queue a list of documents, full bulk requests are sent in the background. Return the NDJSON size."""
+        if self.start is None:
+            self.start = self.clock()
+        size = 0
+        for record in records:
+            item = '{"index":{}}\n' + json.dumps(record, separators=(",", ":")) + "\n"
+            self.pending.append(item)
+            self.pending_size += len(item)
+            size += len(item)
+            if self.pending_size >= self.bulk_bytes:
+                self._submit()
+        return size
+
+    def _submit(self):
+        if not self.pending:
+            return
+
+        # Finished requests are checked, so that a failed one stops the generation
+        done = [future for future in self.in_flight if future.done()]
+        self.in_flight = [future for future in self.in_flight if not future.done()]
+        for future in done:
+            future.result()
+
+        items = self.pending
+        self.pending = []
+        self.pending_size = 0
+        if len(self.in_flight) >= self.concurrency:
+            # Bounds memory and lets backpressure slow down generation
+            self.in_flight.pop(0).result()
+        self.in_flight.append(self.executor.submit(self._send, items))
+
+    def _send(self, items):
+        """Send one bulk request, then only its throttled documents, until they are all accepted.
+
+        When the request fails, the documents not indexed yet are counted as errors and the error is raised.
+        """
+        attempt = 0
+        try:
+            while items:
+                body = "".join(items).encode("utf-8")
+                start_time = time.perf_counter()
+                response = self.http.request("POST", self.url, body=body, headers=self.headers, retries=False)
+                latency = time.perf_counter() - start_time
+
+                if response.status == 429:
+                    retry_items, errors, delay = items, 0, response.headers.get("Retry-After")
+                elif response.status >= 300:
+                    raise RuntimeError("Bulk request failed with HTTP {}: {}".format(
+                        response.status, response.data[:500].decode("utf-8", "replace")))
+                else:
+                    retry_items, errors = self._rejected_items(items, json.loads(response.data))
+                    delay = None
+
+                with self.lock:
+                    self.requests += 1
+                    self.latencies.append(latency)
+                    self.docs += len(items) - len(retry_items) - errors
+                    self.bytes += len(body)
+                    self.throttled += len(retry_items)
+                    self.errors += errors
+
+                items = retry_items
+                if items:
+                    if attempt >= self.max_retries:
+                        raise RuntimeError("{} documents still throttled after {} retries".format(len(items), attempt))
+                    delay = retry_after(delay) if delay is not None else None
+                    self.sleep(delay if delay is not None else
+                               random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt)))
+                    attempt += 1
+        except Exception:
+            with self.lock:
+                self.errors += len(items)
+            raise
+
+    def _rejected_items(self, items, result):
+        """Return the items throttled with 429 in a bulk response and the number of other failed items."""
+        if not result.get("errors"):
+            return [], 0
+
+        retry_items = []
+        errors = 0
+        for item, response in zip(items, result["items"]):
+            status = next(iter(response.values())).get("status", 200)
+            if status == 429:
+                retry_items.append(item)
+            elif status >= 300:
+                errors += 1
+        return retry_items, errors
+
+    def flush(self):
+        """Send the pending documents and wait for every request in flight, then raise the first failure."""
+        self._submit()
+        in_flight, self.in_flight = self.in_flight, []
+        errors = [future.exception() for future in in_flight]
+        for error in errors:
+            if error is not None:
+                raise error
+
+    def close(self):
+        if self.closed:
+            return
+
+        try:
+            self.flush()
+        finally:
+            self.executor.shutdown(wait=True)
+            self.http.clear()
+            self.closed = True
+        stats = self.stats()
+        logger.info("Indexed %d documents in %d bulk requests, %.1f docs/sec, p50 %.3f p99 %.3f secs"
+                    % (stats["docs"], stats["requests"], stats["docs_per_sec"], stats["latency_p50"],
+                       stats["latency_p99"]))
+
+    def abort(self):
+        """Drop the pending documents, requests in flight are completed."""
+        self.pending = []
+        self.pending_size = 0
+        self.executor.shutdown(wait=True)
+        self.http.clear()
+        self.closed = True
+
+    def stats(self):
+        """Return the documents indexed, the docs/sec and the bulk request latency percentiles (secs)."""
+        elapsed = self.clock() - self.start if self.start is not None else 0.0
+        with self.lock:
+            latencies = sorted(self.latencies)
+            return {
+                "docs": self.docs,
+                "bytes": self.bytes,
+                "requests": self.requests,
+                "throttled": self.throttled,
+                "errors": self.errors,
+                "elapsed": elapsed,
+                "docs_per_sec": self.docs / elapsed if elapsed > 0 else 0.0,
+                "latency_p50": percentile(latencies, 0.5),
+                "latency_p90": percentile(latencies, 0.9),
+                "latency_p99": percentile(latencies, 0.99),
+                "latency_max": latencies[-1] if latencies else 0.0,
+            }
@@ -0,0 +1,126 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import sys
+import time
+
+
+class RateLimiter:
+    """Token bucket pacing lines against a monotonic clock.
+
+    Line i is due at start + i / rate. acquire() waits for the next due line and hands out every line due so far
+    (up to a micro-batch limit), so time spent generating and writing is absorbed instead of accumulating drift as
+    with a fixed sleep between lines. When the writer cannot keep up, at most burst lines are caught up at once
+    and the lag is reported.
+    """
+
+    def __init__(self, rate, burst=None, clock=time.monotonic, sleep=time.sleep):
+        if rate <= 0:
+            raise ValueError("The rate must be positive")
+
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1, int(rate))
+        self.clock = clock
+        self.sleep = sleep
+        self.start = None
+        self.emitted = 0
+        self.max_lag = 0
+
+    def due(self, now):
+        """Return the number of lines due and not yet handed out at the given time."""
+        return int((now - self.start) * self.rate) - self.emitted
+
+    def acquire(self, limit):
+        """Block until at least one line is due, then return how many lines (at most limit) may be written."""
+        now = self.clock()
+        if self.start is None:
+            self.start = now
+
+        due = self.due(now)
+        if due < 1:
+            self.sleep(max(self.next_due() - now, 0))
+            due = max(self.due(self.clock()), 1)
+
+        self.max_lag = max(self.max_lag, self.lag(due))
+        granted = min(due, limit, self.burst)
+        self.emitted += granted
+        return granted
+
+    def poll(self, now, limit):
+        """Return how many lines (at most limit) are due at the given time, without waiting.
+
+        For schedulers pacing several limiters from one thread, see next_due().
+        """
+        if self.start is None:
+            self.start = now
+
+        due = self.due(now)
+        if due < 1:
+            return 0
+
+        self.max_lag = max(self.max_lag, self.lag(due))
+        granted = min(due, limit, self.burst)
+        self.emitted += granted
+        return granted
+
+    def lag(self, due):
+        """Return how late the first of due lines is (secs)."""
+        return (due - 1) / self.rate
+
+    def next_due(self, lines=1):
+        """Return the clock time at which lines more lines will be due."""
+        return self.start + (self.emitted + lines) / self.rate
+
+    def stats(self):
+        """Return the target and achieved rates (lines/sec) since the first acquire()."""
+        elapsed = self.clock() - self.start if self.start is not None else 0.0
+        return {
+            "lines": self.emitted,
+            "elapsed": elapsed,
+            "target_rate": self.rate,
+            "achieved_rate": self.emitted / elapsed if elapsed > 0 else 0.0,
+            "max_lag": self.max_lag,
+        }
+
+
+class ProfileLimiter(RateLimiter):
+    """RateLimiter following the rate curve of a util.profiles.LoadProfile instead of a constant rate.
+
+    Line i is due at start + t, t being the time at which the profile reaches i lines. At most burst lines (no limit
+    by default, only the micro-batch one) are caught up at once.
+    """
+
+    def __init__(self, profile, burst=None, clock=time.monotonic, sleep=time.sleep):
+        self.profile = profile
+        # Both cursors only move forward: lines due at the current time, and time of the next due lines
+        self.lines = profile.cursor()
+        self.times = profile.cursor()
+        self.burst = burst if burst is not None else sys.maxsize
+        self.clock = clock
+        self.sleep = sleep
+        self.start = None
+        self.emitted = 0
+        self.max_lag = 0
+
+    def due(self, now):
+        return int(self.lines.lines_at(now - self.start)) - self.emitted
+
+    def lag(self, due):
+        rate = self.profile.rate(self.lines.t)
+        return (due - 1) / rate if rate > 0 else 0.0
+
+    def next_due(self, lines=1):
+        elapsed = self.times.time_at(self.emitted + lines)
+        return self.start + (elapsed if elapsed is not None else self.profile.duration)
+
+    def stats(self):
+        """Return the mean target rate of the profile and the achieved rate (lines/sec) since the first acquire()."""
+        elapsed = self.clock() - self.start if self.start is not None else 0.0
+        expected = self.lines.lines_at(elapsed)
+        return {
+            "lines": self.emitted,
+            "elapsed": elapsed,
+            "target_rate": expected / elapsed if elapsed > 0 else 0.0,
+            "achieved_rate": self.emitted / elapsed if elapsed > 0 else 0.0,
+            "max_lag": self.max_lag,
+        }
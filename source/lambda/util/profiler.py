@@ -0,0 +1,92 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import sys
+import time
+from util.tools import is_constant
+
+# Keys of the timings which are not tokens.
+LINE = "[line]"
+ASSEMBLY = "[assembly]"
+WRITE = "[write]"
+
+
+class TokenProfiler:
+    """Call counts and cumulative nanoseconds per token key.
+
+    Profiling is opt-in: tokens are only wrapped with timers when a profiler is given to FakeTokens or LinePattern,
+    so the generation loop is untouched otherwise. Constant tokens are folded into the line template and never
+    called, they are not wrapped.
+    """
+
+    def __init__(self):
+        self.calls = {}
+        self.nanoseconds = {}
+
+    def record(self, key, nanoseconds, calls=1):
+        self.calls[key] = self.calls.get(key, 0) + calls
+        self.nanoseconds[key] = self.nanoseconds.get(key, 0) + nanoseconds
+
+    def wrap(self, key, token):
+        """Return the token timed under key, run_many and raw_many included."""
+        if is_constant(token) or getattr(token, "profiled", False):
+            return token
+
+        record = self.record
+        clock = time.perf_counter_ns
+
+        def timed_token():
+            start = clock()
+            value = token()
+            record(key, clock() - start)
+            return value
+
+        def timed_many(many):
+            def timed_run_many(k):
+                start = clock()
+                values = many(k)
+                record(key, clock() - start, k)
+                return values
+
+            return timed_run_many
+
+        for name in ("run_many", "raw_many"):
+            many = getattr(token, name, None)
+            if many is not None:
+                setattr(timed_token, name, timed_many(many))
+
+        timed_token.profiled = True
+        return timed_token
+
+    def timed(self, key, func):
+        """Return func timed under key."""
+        record = self.record
+        clock = time.perf_counter_ns
+
+        def timed_func(*args):
+            start = clock()
+            value = func(*args)
+            record(key, clock() - start)
+            return value
+
+        return timed_func
+
+    def report(self):
+        """Return {key: {"calls", "nanoseconds", "ns_per_call", "share"}} sorted by cumulative time."""
+        total = sum(ns for key, ns in self.nanoseconds.items() if key != LINE) or 1
+        return {
+            key: {
+                "calls": self.calls[key],
+                "nanoseconds": ns,
+                "ns_per_call": ns / self.calls[key] if self.calls[key] else 0.0,
+                "share": ns / total if key != LINE else None,
+            }
+            for key, ns in sorted(self.nanoseconds.items(), key=lambda item: -item[1])
+        }
+
+    def print_report(self, file=sys.stderr):
+        print("{:<30} {:>12} {:>16} {:>12} {:>7}".format("key", "calls", "total ns", "ns/call", "share"), file=file)
+        for key, stats in self.report().items():
+            share = "" if stats["share"] is None else "{:.1%}".format(stats["share"])
+            print("{:<30} {:>12} {:>16} {:>12.0f} {:>7}".format(key, stats["calls"], stats["nanoseconds"],
+                                                              stats["ns_per_call"], share), file=file)
@@ -0,0 +1,223 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+"""Load profiles: target rate (lines/sec) over time, to stress a log pipeline with a traffic shape.
+
+A profile is declared in JSON, e.g.
+
+    {
+        "phases": [
+            {"shape": "ramp", "duration": 600, "start": 1000, "end": 40000, "steps": 8},
+            {"shape": "constant", "duration": 120, "rate": 40000},
+            {"shape": "diurnal", "duration": 86400, "mean": 5000, "amplitude": 4000, "peak": 50400}
+        ],
+        "bursts": {"interval": 300, "duration": 10, "multiplier": 4},
+        "spikes": [{"at": 700, "duration": 5, "rate": 80000}],
+        "repeat": false
+    }
+
+Phases follow each other, then the profile ends (or starts over with repeat). Bursts start at random, as a Poisson
+process of mean interval secs, and multiply the rate for their duration. Spikes replace (rate) or multiply
+(multiplier) the rate at fixed times. Times are secs since the start of the profile.
+"""
+
+import bisect
+import csv
+import datetime
+import json
+import math
+import random
+
+# Integration step of the profiles (secs), the rate is taken as constant over one step
+resolution = 0.01
+
+
+def constant_shape(duration, rate):
+    return lambda t: rate
+
+
+def ramp_shape(duration, start, end, steps=None):
+    """Linear ramp from start to end lines/sec, or a staircase of steps levels (the last one at end)."""
+    if steps is None:
+        return lambda t: start + (end - start) * t / duration
+    if steps < 2:
+        raise ValueError("A step ramp needs at least 2 steps")
+    step_duration = duration / steps
+    return lambda t: start + (end - start) * min(int(t / step_duration), steps - 1) / (steps - 1)
+
+
+def diurnal_shape(duration, mean, amplitude, period=86400, peak=0):
+    """Sinusoidal rate of the given period, at mean + amplitude peak secs into the phase."""
+    return lambda t: max(0.0, mean + amplitude * math.cos(2 * math.pi * (t - peak) / period))
+
+
+shapes = {"constant": constant_shape, "ramp": ramp_shape, "diurnal": diurnal_shape}
+
+
+class LoadProfile:
+    """Target rate of a declarative schedule of phases, bursts and spikes, see the module documentation."""
+
+    def __init__(self, phases, bursts=None, spikes=(), repeat=False, seed=None):
+        if not phases:
+            raise ValueError("A load profile needs at least one phase")
+
+        self.starts = []
+        self.shapes = []
+        start = 0.0
+        for phase in phases:
+            phase = dict(phase)
+            shape = phase.pop("shape", "constant")
+            if shape not in shapes:
+                raise ValueError("Unsupported shape '{}', expected one of {}".format(shape, ", ".join(shapes)))
+            if phase.get("duration", 0) <= 0:
+                raise ValueError("Every phase needs a positive duration")
+            self.starts.append(start)
+            self.shapes.append(shapes[shape](**phase))
+            start += phase["duration"]
+        self.period = start
+        self.repeat = repeat
+        # Bursts and spikes cannot bring back lines once the phases are at 0, time_at() would look forever
+        if repeat and not any(self.base_rate(t) > 0 for t in self._sample_times(phases)):
+            raise ValueError("A repeating profile needs a positive rate in at least one phase")
+        # None when the profile never ends
+        self.duration = None if repeat else self.period
+
+        if bursts is not None:
+            missing = {"interval", "duration", "multiplier"} - set(bursts)
+            if missing:
+                raise ValueError("bursts needs {}".format(", ".join(sorted(missing))))
+            if bursts["interval"] <= 0:
+                raise ValueError("The interval of bursts must be positive")
+        self.bursts = bursts
+        self.burst_starts = []
+        self.rng = random.Random(seed)
+        self.spikes = [dict(spike) for spike in spikes]
+        for spike in self.spikes:
+            missing = {"at", "duration"} - set(spike)
+            if missing:
+                raise ValueError("Every spike needs {}".format(", ".join(sorted(missing))))
+            if ("rate" in spike) == ("multiplier" in spike):
+                raise ValueError("A spike sets either a rate or a multiplier")
+
+    def _sample_times(self, phases, samples=100):
+        """Return samples + 1 evenly spaced times within each phase, both ends included."""
+        for start, phase in zip(self.starts, phases):
+            for i in range(samples + 1):
+                yield min(start + phase["duration"] * i / samples, self.period - resolution / 2)
+
+    @classmethod
+    def from_dict(cls, spec, seed=None):
+        if "phases" not in spec:
+            raise ValueError("A load profile needs phases")
+        return cls(spec["phases"], spec.get("bursts"), spec.get("spikes", ()), spec.get("repeat", False),
+                   spec.get("seed", seed))
+
+    def base_rate(self, t):
+        """Rate of the phases alone at t secs."""
+        if self.repeat:
+            t %= self.period
+        elif t >= self.period:
+            return 0.0
+        index = bisect.bisect_right(self.starts, t) - 1
+        return self.shapes[index](t - self.starts[index])
+
+    def in_burst(self, t):
+        """Return True during a burst. Burst start times are drawn lazily, always in the same order."""
+        while not self.burst_starts or self.burst_starts[-1] <= t:
+            last = self.burst_starts[-1] if self.burst_starts else 0.0
+            self.burst_starts.append(last + self.rng.expovariate(1 / self.bursts["interval"]))
+        index = bisect.bisect_right(self.burst_starts, t) - 1
+        return index >= 0 and t < self.burst_starts[index] + self.bursts["duration"]
+
+    def rate(self, t):
+        """Target lines/sec at t secs."""
+        rate = self.base_rate(t)
+        if self.bursts is not None and self.in_burst(t):
+            rate *= self.bursts["multiplier"]
+        for spike in self.spikes:
+            if spike["at"] <= t < spike["at"] + spike["duration"]:
+                rate = spike["rate"] if "rate" in spike else rate * spike["multiplier"]
+        return rate
+
+    def cursor(self):
+        return ProfileCursor(self)
+
+
+def load_profile(filename, seed=None):
+    """Read a LoadProfile from a JSON file."""
+    with open(filename) as f:
+        return LoadProfile.from_dict(json.load(f), seed)
+
+
+class ProfileCursor:
+    """Integral of the rate of a profile: lines due after t secs, and its inverse, the time of the n-th line.
+
+    Steps of resolution secs are integrated as the cursor moves forward, going backward starts over from 0.
+    lines_at() and time_at() share the same steps so that they are exact inverses of each other.
+    """
+
+    def __init__(self, profile):
+        self.profile = profile
+        # Counted in steps, adding resolution up would drift
+        self.steps = 0
+        self.t = 0.0
+        self.lines = 0.0
+
+    def _step_rate(self):
+        return self.profile.rate(self.t + resolution / 2)
+
+    def _advance(self, rate):
+        self.lines += rate * resolution
+        self.steps += 1
+        self.t = self.steps * resolution
+
+    def lines_at(self, t):
+        """Return the (fractional) number of lines due after t secs."""
+        if t < self.t:
+            self.__init__(self.profile)
+        while (self.steps + 1) * resolution <= t:
+            self._advance(self._step_rate())
+        return self.lines + self._step_rate() * (t - self.t)
+
+    def time_at(self, lines):
+        """Return the time (secs) at which lines lines are due, None if the profile ends before."""
+        if lines < self.lines:
+            self.__init__(self.profile)
+        duration = self.profile.duration
+        while True:
+            if duration is not None and self.t >= duration - resolution / 2:
+                return None
+            rate = self._step_rate()
+            if self.lines + rate * resolution >= lines:
+                t = self.t + (lines - self.lines) / rate if rate > 0 else self.t
+                return t if duration is None or t < duration else None
+            self._advance(rate)
+
+
+class RateSeries:
+    """Lines written and worst lag per second, to compare the realized rate with the profile and the pipeline lag."""
+
+    def __init__(self):
+        self.lines = []
+        self.lags = []
+
+    def record(self, elapsed, lines, lag=0.0):
+        second = int(elapsed)
+        if second >= len(self.lines):
+            self.lines.extend([0] * (second + 1 - len(self.lines)))
+            self.lags.extend([0.0] * (second + 1 - len(self.lags)))
+        self.lines[second] += lines
+        self.lags[second] = max(self.lags[second], lag)
+
+    def write_csv(self, filename, profile, date):
+        """Write one row per second: its date, the target and realized lines/sec and the max lag (secs)."""
+        cursor = profile.cursor()
+        with open(filename, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["timestamp", "second", "target_rate", "realized_rate", "max_lag"])
+            expected = 0.0
+            for second, (lines, lag) in enumerate(zip(self.lines, self.lags)):
+                target = cursor.lines_at(second + 1) - expected
+                expected += target
+                writer.writerow([(date + datetime.timedelta(seconds=second)).isoformat(), second,
+                                 "%.1f" % target, lines, "%.3f" % lag])
@@ -0,0 +1,135 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import io
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+MiB = 1024 * 1024
+
+# S3 rejects multipart parts smaller than 5 MiB, except the last one.
+MIN_PART_SIZE = 5 * MiB
+
+
+class S3MultipartWriter(io.RawIOBase):
+    """Binary stream uploaded to S3 while it is written.
+
+    Written bytes are buffered in memory and every full part is sent as an UploadPart in a background thread, so
+    generation and upload overlap. At most max_workers parts are in flight, which bounds memory to about
+    (max_workers + 1) * part_size. close() completes the upload, abort() (or an exception inside a with block)
+    cancels it. A writer garbage collected before close() is aborted, so that no truncated object is published.
+    An object smaller than one part is sent with a single PutObject.
+    """
+
+    def __init__(self, client, bucket, key, part_size=16 * MiB, max_workers=4, **extra_args):
+        super().__init__()
+        if part_size < MIN_PART_SIZE:
+            raise ValueError("The part size must be at least {} bytes".format(MIN_PART_SIZE))
+
+        self.client = client
+        self.bucket = bucket
+        self.key = key
+        self.part_size = part_size
+        self.max_workers = max_workers
+        self.extra_args = extra_args
+        self.upload_id = None
+        self.bytes_written = 0
+        self.start_time = time.time()
+        self._buffer = bytearray()
+        self._parts = []
+        self._executor = None
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._buffer += data
+        self.bytes_written += len(data)
+        while len(self._buffer) >= self.part_size:
+            self._upload_part(bytes(self._buffer[:self.part_size]))
+            del self._buffer[:self.part_size]
+        return len(data)
+
+    def _upload_part(self, body):
+        if self.upload_id is None:
+            response = self.client.create_multipart_upload(Bucket=self.bucket, Key=self.key, **self.extra_args)
+            self.upload_id = response["UploadId"]
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+
+        in_flight = [part for part in self._parts if not part.done()]
+        if len(in_flight) >= self.max_workers:
+            in_flight[0].result()
+
+        part_number = len(self._parts) + 1
+        self._parts.append(self._executor.submit(self._send_part, part_number, body))
+
+    def _send_part(self, part_number, body):
+        response = self.client.upload_part(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id,
+                                           PartNumber=part_number, Body=body)
+        return {"ETag": response["ETag"], "PartNumber": part_number}
+
+    def close(self):
+        """Flush the last part and complete the upload."""
+        if self.closed:
+            return
+
+        try:
+            if self.upload_id is None:
+                self.client.put_object(Bucket=self.bucket, Key=self.key, Body=bytes(self._buffer), **self.extra_args)
+            else:
+                if self._buffer:
+                    self._upload_part(bytes(self._buffer))
+                parts = [part.result() for part in self._parts]
+                self.client.complete_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id,
+                                                      MultipartUpload={"Parts": parts})
+        except Exception:
+            self.abort()
+            raise
+
+        self._buffer = bytearray()
+        self._shutdown()
+        super().close()
+        elapsed = time.time() - self.start_time
+        logger.info("Uploaded %d bytes to s3://%s/%s in %d parts, %f secs"
+                    % (self.bytes_written, self.bucket, self.key, max(len(self._parts), 1), elapsed))
+
+    def abort(self, wait=True):
+        """Drop the buffered data and abort the multipart upload, no object is created.
+
+        Without wait, the parts in flight are not waited for, they fail once the upload is aborted.
+        """
+        if self.closed:
+            return
+
+        self._buffer = bytearray()
+        for part in self._parts:
+            part.cancel()
+        self._shutdown(wait)
+        if self.upload_id is not None:
+            try:
+                self.client.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id)
+            except Exception as e:
+                logger.error("Failed to abort the multipart upload of s3://%s/%s" % (self.bucket, self.key))
+                logger.error(e)
+        super().close()
+
+    def _shutdown(self, wait=True):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+
+    def __del__(self):
+        # IOBase.__del__ would call close(), which completes the upload with whatever is buffered. The last
+        # reference may be dropped by an upload thread, which cannot wait for itself.
+        if not self.closed:
+            self.abort(wait=False)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self.abort()
+        else:
+            self.close()
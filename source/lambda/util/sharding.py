@@ -0,0 +1,166 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import datetime
+import gc
+import multiprocessing
+import os
+import random
+import shutil
+import traceback
+import util.faker_config as config
+from util.fake_tokens import FakeTokens
+from util.line_pattern import LinePattern
+from util.log_generator import FakeLogs
+from util.tools import derive_seed
+
+# Average move of the date between two lines when FakeTokens.sleep is None (random.randint(-2, 0)).
+default_date_step = -1
+
+
+def split_lines(num_lines, shards):
+    """Split num_lines into shards counts differing by at most one line."""
+    return [num_lines // shards + (1 if shard < num_lines % shards else 0) for shard in range(shards)]
+
+
+def shard_filename(filename, shard):
+    """Return the name of a shard output, e.g. logs.gz -> logs.003.gz."""
+    root, ext = os.path.splitext(filename)
+    return "{}.{:03d}{}".format(root, shard, ext)
+
+
+class ShardedFakeLogs:
+    """Generate fake logs with one worker process per shard.
+
+    num_lines is split across workers, each one building its own LinePattern and FakeTokens and starting at the
+    date where the previous shard is expected to end, so that shard windows follow each other like a single
+    stream. Shards are written to separate files (or objects, with an opener) and, for local files, concatenated
+    into filename when merge is True: gzip members, bz2, xz and zstd streams stay valid once concatenated. With
+    rotation, every shard rotates its own files and nothing is merged.
+
+    With a seed, shard i of N draws from its own stream seeded with derive_seed(seed, i, N): for a given seed,
+    date and number of workers, every shard and thus the merged output is reproducible byte for byte.
+
+    Workers are plain processes connected with pipes, multiprocessing.Pool and Queue need /dev/shm which does not
+    exist on AWS Lambda.
+    """
+
+    def __init__(self, filename, num_lines=10, file_format="elf", pattern=None, date_pattern=None, date=None,
+                 sleep=None, workers=None, merge=True, opener=None, batch_size=10000, rotate_lines=None,
+                 rotate_bytes=None, rotate_seconds=None, distribution_id=None, codec=None, compress_level=None,
+                 seed=None):
+        if num_lines <= 0:
+            raise ValueError("Sharded generation needs a positive number of lines")
+
+        self.filename = filename
+        self.num_lines = num_lines
+        self.file_format = file_format
+        self.pattern = pattern
+        self.date_pattern = date_pattern
+        self.date = date if date is not None else \
+            datetime.datetime.now() + datetime.timedelta(minutes=config.preview_time)
+        self.sleep = sleep
+        self.seed = seed
+        self.workers = min(workers or os.cpu_count() or 1, num_lines)
+        self.opener = opener
+        self.batch_size = batch_size
+        self.rotation = dict(rotate_lines=rotate_lines, rotate_bytes=rotate_bytes, rotate_seconds=rotate_seconds,
+                             distribution_id=distribution_id)
+        self.compression = dict(codec=codec, compress_level=compress_level)
+        rotate = any(limit is not None for limit in (rotate_lines, rotate_bytes, rotate_seconds))
+        self.merge = merge and opener is None and not rotate
+
+    def shards(self):
+        """Return the (filename, num_lines, date, seed) of every shard."""
+        step = self.sleep if self.sleep is not None else default_date_step
+        shards = []
+        offset = 0
+        for shard, num_lines in enumerate(split_lines(self.num_lines, self.workers)):
+            date = self.date + datetime.timedelta(seconds=step * offset)
+            seed = None if self.seed is None else derive_seed(self.seed, shard, self.workers)
+            shards.append((shard_filename(self.filename, shard), num_lines, date, seed))
+            offset += num_lines
+        return shards
+
+    def run_shard(self, filename, num_lines, date, seed=None):
+        """Generate one shard in the current process and return its files.
+
+        sleep only moves the dates, lines are not delayed.
+        """
+        fake_tokens = FakeTokens(date=date, sleep=self.sleep, seed=seed)
+        line_pattern = LinePattern(self.pattern, date_pattern=self.date_pattern, file_format=self.file_format,
+                                   fake_tokens=fake_tokens)
+        fake_logs = FakeLogs(filename=filename, num_lines=num_lines, line_pattern=line_pattern, opener=self.opener,
+                             batch_size=self.batch_size, seed=seed, **self.rotation, **self.compression)
+        fake_logs.run()
+        return fake_logs.filenames
+
+    def _worker(self, conn, filename, num_lines, date, seed):
+        try:
+            # Forked workers inherit the random state of the parent, without a seed they must not produce the same
+            # lines. Seeded shards only use their own generators.
+            random.seed()
+            from faker import Faker
+            Faker.seed()
+            conn.send((None, self.run_shard(filename, num_lines, date, seed)))
+        except BaseException:
+            conn.send((traceback.format_exc(), []))
+        finally:
+            conn.close()
+
+    def run(self):
+        """Generate every shard, return the list of written files."""
+        shards = self.shards()
+        if self.workers == 1:
+            filenames = self.run_shard(*shards[0])
+        else:
+            filenames = self._run_processes(shards)
+
+        if self.merge:
+            self._merge(filenames)
+            return [self.filename]
+        return filenames
+
+    def _run_processes(self, shards):
+        fork = multiprocessing.get_start_method() == "fork"
+        if fork:
+            # Forked workers share the token tables (util.tools.WeightTable, IPTable) and the Faker built here,
+            # frozen objects are left alone by the garbage collector so that their pages are not copied.
+            shared_pattern = LinePattern(self.pattern, date_pattern=self.date_pattern, file_format=self.file_format)
+            gc.freeze()
+
+        processes = []
+        try:
+            for shard in shards:
+                parent_conn, child_conn = multiprocessing.Pipe(duplex=False)
+                process = multiprocessing.Process(target=self._worker, args=(child_conn, *shard))
+                process.start()
+                child_conn.close()
+                processes.append((process, parent_conn))
+        finally:
+            if fork:
+                gc.unfreeze()
+                del shared_pattern
+
+        errors = []
+        filenames = []
+        for process, conn in processes:
+            try:
+                error, shard_filenames = conn.recv()
+            except EOFError:
+                error, shard_filenames = "Worker exited without a result", []
+            process.join()
+            filenames += shard_filenames
+            if error is not None:
+                errors.append(error)
+
+        if errors:
+            raise RuntimeError("{} of {} workers failed:\n{}".format(len(errors), len(shards), "\n".join(errors)))
+        return filenames
+
+    def _merge(self, filenames):
+        with open(self.filename, "wb") as output:
+            for filename in filenames:
+                with open(filename, "rb") as shard:
+                    shutil.copyfileobj(shard, output, 1024 * 1024)
+                os.remove(filename)
@@ -0,0 +1,104 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import datetime
+import math
+import re
+
+EPOCH = datetime.datetime(1970, 1, 1)
+
+# Directives which do not change within a day, they are rendered once per day with strftime.
+DAY_DIRECTIVES = set("aAbBCdDeFgGhjmuUVwWxyYzZ%")
+
+# Directives which change within a day, they are patched from precomputed tables.
+TIME_DIRECTIVES = {"H": (3600, 24), "M": (60, 60), "S": (1, 60)}
+
+two_digits = ["%02d" % i for i in range(60)]
+
+directive_regex = re.compile("(%.)")
+
+
+def to_seconds(date):
+    """Return the seconds elapsed between EPOCH and a naive datetime."""
+    return (date - EPOCH).total_seconds()
+
+
+def from_seconds(seconds):
+    """Return the naive datetime at the given seconds since EPOCH."""
+    return EPOCH + datetime.timedelta(seconds=seconds)
+
+
+class TimestampFormatter:
+    """strftime for a fixed date pattern, working on whole seconds since EPOCH.
+
+    Formatted strings are cached by second. On a cache miss, the day-level part of the pattern (e.g. %d/%b/%Y) is
+    reused from the previous day rendering and only %H, %M and %S are patched. Patterns using any other intraday
+    directive fall back to strftime, still cached by second.
+    """
+
+    __slots__ = ("date_pattern", "cache_size", "cache", "_day", "_day_parts", "_day_chunks", "_time_fields")
+
+    def __init__(self, date_pattern, cache_size=4096):
+        self.date_pattern = date_pattern
+        self.cache_size = cache_size
+        self.cache = {}
+        self._day = None
+        self._day_parts = None
+        self._day_chunks, self._time_fields = self.split_pattern(date_pattern)
+
+    @staticmethod
+    def split_pattern(date_pattern):
+        """Split a pattern into the strftime chunks around %H/%M/%S, return (None, None) if it cannot be split."""
+        day_chunks = [""]
+        time_fields = []
+        for part in directive_regex.split(date_pattern):
+            if len(part) == 2 and part[0] == "%" and part[1] in TIME_DIRECTIVES:
+                time_fields.append(TIME_DIRECTIVES[part[1]])
+                day_chunks.append("")
+            elif len(part) == 2 and part[0] == "%" and part[1] not in DAY_DIRECTIVES:
+                return None, None
+            else:
+                day_chunks[-1] += part
+        return day_chunks, time_fields
+
+    def _render(self, seconds):
+        if self._day_chunks is None:
+            return from_seconds(seconds).strftime(self.date_pattern)
+
+        day, second_of_day = divmod(seconds, 86400)
+        if day != self._day:
+            date = from_seconds(day * 86400)
+            self._day_parts = [date.strftime(chunk) for chunk in self._day_chunks]
+            self._day = day
+
+        parts = self._day_parts
+        line = parts[0]
+        for (unit, modulus), part in zip(self._time_fields, parts[1:]):
+            line += two_digits[second_of_day // unit % modulus] + part
+        return line
+
+    def format(self, seconds):
+        """Format the date at the given seconds since EPOCH, the fractional part is dropped."""
+        seconds = math.floor(seconds)
+        try:
+            return self.cache[seconds]
+        except KeyError:
+            pass
+
+        if len(self.cache) >= self.cache_size:
+            self.cache.clear()
+        line = self.cache[seconds] = self._render(seconds)
+        return line
+
+    __call__ = format
+
+    def format_many(self, seconds):
+        """Format a whole column of seconds since EPOCH."""
+        cache = self.cache
+        lines = []
+        for second in map(math.floor, seconds):
+            line = cache.get(second)
+            if line is None:
+                line = self.format(second)
+            lines.append(line)
+        return lines
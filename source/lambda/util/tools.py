@@ -1,67 +1,335 @@
 # Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
 # SPDX-License-Identifier: MIT-0
 
+import array
+import bisect
+import hashlib
+import itertools
+import json
 import logging
 import os
 import random
+import socket
+import sys
+import time
+import weakref
 import ipaddress
 import util.faker_config as config
+from concurrent.futures import ThreadPoolExecutor
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
 
+class WeightTable:
+    """Values and cumulative weights of a WeightedChoice, shared by every WeightedChoice of the same table.
+
+    Values are kept in a tuple (strings interned) and cumulative weights in a flat array of doubles. Tables are
+    read-only: tables built before a fork are used by the workers without being copied.
+    """
+
+    __slots__ = ("values", "cum_weights", "total", "__weakref__")
+
+    def __init__(self, values, weights):
+        self.values = tuple(sys.intern(value) if type(value) is str else value for value in values)
+        self.cum_weights = array.array("d", itertools.accumulate(weights))
+        self.total = self.cum_weights[-1] if self.cum_weights else 0
+
+
+# Tables in use by (values, weights), see weight_table()
+weight_tables = weakref.WeakValueDictionary()
+
+
+def weight_table(values, weights=None):
+    """Return the WeightTable of values and weights, shared with the other tokens using the same ones."""
+    values = tuple(values)
+    if weights is None:
+        weights = (1,) * len(values)
+    elif len(weights) < len(values):
+        raise ValueError("Got {} values but only {} weights".format(len(values), len(weights)))
+    weights = tuple(weights[:len(values)])
+
+    try:
+        table = weight_tables.get((values, weights))
+    except TypeError:
+        # Unhashable values cannot be shared
+        return WeightTable(values, weights)
+    if table is None:
+        table = weight_tables[values, weights] = WeightTable(values, weights)
+    return table
+
+
 class WeightedChoice:
-    """Weighted version of random.choice."""
+    """Weighted version of random.choice.
 
-    def __init__(self, values, weights=None):
-        if weights is None:
-            weights = [1] * len(values)
+    Weights are folded into a cumulative table once, so each draw is a bisection instead of a linear scan.
+    Extra weights beyond the number of values are ignored, values without a weight are rejected. Draws come from
+    rng, the random module by default or a seeded random.Random. The table is shared, see weight_table().
+    """
+
+    __slots__ = ("rng", "table", "values", "cum_weights", "total", "_hi")
 
-        self.choices = [[x, y] for x, y in zip(values, weights)]
-        self.total = sum(w for c, w in self.choices)
+    def __init__(self, values, weights=None, rng=random):
+        # Keeps the shared table alive, its fields are also bound to the instance for faster lookups
+        self.table = table = weight_table(values, weights)
+        self.rng = rng
+        self.values = table.values
+        self.cum_weights = table.cum_weights
+        self.total = table.total
+        self._hi = max(len(self.values) - 1, 0)
 
     def run(self):
         """Get a random value."""
-        rnd = random.uniform(0, self.total)
-        upto = 0
-        for choice, weight in self.choices:
-            if upto + weight >= rnd:
-                return choice
-            upto += weight
-        assert False, "Shouldn't get here."
-        return None
+        return self.values[bisect.bisect(self.cum_weights, self.rng.random() * self.total, 0, self._hi)]
 
+    __call__ = run
 
-def upload_folder_to_s3(s3_bucket, input_dir, s3_path):
+    def run_many(self, k):
+        """Get a list of k random values."""
+        return self.rng.choices(self.values, cum_weights=self.cum_weights, k=k)
+
+
+class IPTable:
+    """CIDR blocks of an IPPool as flat arrays: start address, size, cumulative weight, and the scale from a weight
+    to an offset in the block. Read-only and shared like WeightTable.
     """
-    Upload a folder to s3, and keep the folder structure
-    :param s3_bucket:
-    :param input_dir:
-    :param s3_path:
-    :return:
+
+    __slots__ = ("starts", "sizes", "cum_weights", "lows", "scales", "total", "__weakref__")
+
+    def __init__(self, cidrs, weights=None):
+        networks = [ipaddress.IPv4Network(cidr) for cidr in cidrs]
+        self.starts = array.array("L", (int(network.network_address) for network in networks))
+        self.sizes = array.array("L", (network.num_addresses for network in networks))
+        if weights is None:
+            weights = self.sizes
+        elif len(weights) != len(self.sizes):
+            raise ValueError("Got {} CIDR blocks but {} weights".format(len(self.sizes), len(weights)))
+
+        self.cum_weights = array.array("d", itertools.accumulate(weights))
+        self.total = self.cum_weights[-1] if self.cum_weights else 0
+        self.lows = array.array("d", [0]) + self.cum_weights[:-1]
+        self.scales = array.array("d", (size / weight if weight else 0 for size, weight in zip(self.sizes, weights)))
+
+
+# Tables in use by (cidrs, weights), see IPPool
+ip_tables = weakref.WeakValueDictionary()
+
+
+class IPPool:
+    """Pool of IPv4 addresses backed by integer ranges, only the drawn address is formatted.
+
+    Each CIDR block is kept as a (start, size) pair with a cumulative weight index. By default a block weighs its
+    size, which makes every address of the pool equally likely. The address inside a block is always uniform.
+    Pools of the same blocks and weights share one IPTable.
     """
+
+    __slots__ = ("rng", "table", "starts", "sizes", "cum_weights", "total", "_lows", "_scales", "_hi")
+
+    def __init__(self, cidrs, weights=None, rng=random):
+        key = (tuple(cidrs), None if weights is None else tuple(weights))
+        table = ip_tables.get(key)
+        if table is None:
+            table = ip_tables[key] = IPTable(cidrs, weights)
+        self.table = table
+        self.rng = rng
+        self.starts = table.starts
+        self.sizes = table.sizes
+        self.cum_weights = table.cum_weights
+        self.total = table.total
+        self._lows = table.lows
+        self._scales = table.scales
+        self._hi = max(len(self.sizes) - 1, 0)
+
+    @classmethod
+    def from_regions(cls, region_cidrs, region_weights=None, rng=random):
+        """Build a pool from {region: [cidr, ...]}, each region being drawn according to region_weights."""
+        if region_weights is None:
+            return cls([cidr for cidrs in region_cidrs.values() for cidr in cidrs], rng=rng)
+
+        cidrs = []
+        weights = []
+        for region, region_weight in region_weights.items():
+            sizes = [ipaddress.IPv4Network(cidr).num_addresses for cidr in region_cidrs[region]]
+            region_size = sum(sizes)
+            cidrs += region_cidrs[region]
+            weights += [region_weight * size / region_size for size in sizes]
+        return cls(cidrs, weights, rng)
+
+    def __len__(self):
+        return sum(self.sizes)
+
+    def _address(self, rnd):
+        i = bisect.bisect(self.cum_weights, rnd, 0, self._hi)
+        offset = min(int((rnd - self._lows[i]) * self._scales[i]), self.sizes[i] - 1)
+        return int_to_ipv4(self.starts[i] + offset)
+
+    def run(self):
+        """Get a random address."""
+        return self._address(self.rng.random() * self.total)
+
+    __call__ = run
+
+    def run_many(self, k):
+        """Get a list of k random addresses."""
+        total = self.total
+        rnd = self.rng.random
+        return [self._address(rnd() * total) for _ in range(k)]
+
+
+def derive_seed(seed, *path):
+    """Derive an independent seed from a root seed and a path, e.g. derive_seed(seed, shard, shards).
+
+    The same arguments always give the same seed, in any process and any Python version.
+    """
+    text = "/".join(str(part) for part in (seed,) + path)
+    return int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "big")
+
+
+def int_to_ipv4(address):
+    """Format an integer as a dotted IPv4 address."""
+    return socket.inet_ntoa(address.to_bytes(4, "big"))
+
+
+def constant(value):
+    """Return a token which always produces the same value."""
+
+    def get_constant():
+        return value
+
+    get_constant.run_many = lambda k: [value] * k
+    get_constant.constant = True
+    return get_constant
+
+
+def is_constant(token):
+    """Return True if the token was built by constant() and can be folded into a line template."""
+    return getattr(token, "constant", False)
+
+
+def batched(run, run_many):
+    """Attach a bulk sampler to a token, run_many(k) must return a list of k values."""
+    run.run_many = run_many
+    return run
+
+
+def run_many(token, k):
+    """Return a column of k values produced by a token, in bulk when the token supports it."""
+    many = getattr(token, "run_many", None)
+    if many is not None:
+        return many(k)
+    return [token() for _ in range(k)]
+
+
+upload_executors = {}
+
+
+def get_upload_executor(max_workers):
+    """Return the thread pool shared by every upload of this process (and warm Lambda container)."""
+    if max_workers not in upload_executors:
+        upload_executors[max_workers] = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="s3-upload")
+    return upload_executors[max_workers]
+
+
+def file_digest(filename, chunk_size=1024 * 1024):
+    """Return the md5 hex digest of a file."""
+    digest = hashlib.md5()
+    with open(filename, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_manifest(manifest):
+    try:
+        with open(manifest) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(manifest, entries):
+    with open(manifest, "w") as f:
+        json.dump(entries, f)
+
+
+# Name of the default manifest of upload_folder_to_s3, kept in the uploaded folder and never uploaded
+manifest_name = ".upload-manifest.json"
+
+
+def upload_folder_to_s3(s3_bucket, input_dir, s3_path, max_workers=8, transfer_config=None, manifest=None,
+                        files=None):
+    """
+    Upload a folder to s3 with concurrent uploads, and keep the folder structure.
+    Files already uploaded with the same key, size and content (according to the local manifest) are skipped.
+    :param s3_bucket: boto3 Bucket resource
+    :param input_dir: local folder
+    :param s3_path: destination prefix
+    :param max_workers: number of files uploaded at the same time
+    :param transfer_config: boto3 TransferConfig of every file (default: 16 MiB parts, 4 threads)
+    :param manifest: local JSON manifest of uploaded files (default: <input_dir>/.upload-manifest.json)
+    :param files: paths of the files to upload, inside input_dir (default: every file of input_dir)
+    :return: list of {"file", "key", "bytes", "seconds", "skipped"} dicts, one per file
+    """
+    from boto3.s3.transfer import TransferConfig
+
     logger.info("Uploading results to s3 initiated...")
+    if transfer_config is None:
+        transfer_config = TransferConfig(multipart_threshold=16 * 1024 * 1024, multipart_chunksize=16 * 1024 * 1024,
+                                         max_concurrency=4)
+    if manifest is None:
+        manifest = os.path.join(input_dir, manifest_name)
+    uploaded = load_manifest(manifest)
+    if files is None:
+        files = [os.path.join(path, file) for path, subdirs, names in os.walk(input_dir) for file in names
+                 if os.path.join(path, file) != manifest]
+
+    def upload(local_file, s3_file, entry):
+        start_time = time.time()
+        logger.info("Upload : %s  to Target: %s" % (local_file, s3_file))
+        s3_bucket.upload_file(local_file, s3_file, Config=transfer_config)
+        return {"file": local_file, "key": s3_file, "bytes": entry["size"], "seconds": time.time() - start_time,
+                "skipped": False}
 
+    results = []
+    futures = []
     try:
-        for path, subdirs, files in os.walk(input_dir):
-            for file in files:
-                dest_path = path.replace(input_dir, "")
-                __s3file = os.path.normpath(s3_path + '/' + dest_path + '/' + file)
-                __local_file = os.path.join(path, file)
-                logger.info("Upload : %s  to Target: %s" % (__local_file, __s3file))
-                s3_bucket.upload_file(__local_file, __s3file)
+        for __local_file in files:
+            __s3file = os.path.normpath(s3_path + '/' + os.path.relpath(__local_file, input_dir))
+            entry = {"key": __s3file, "size": os.path.getsize(__local_file), "md5": file_digest(__local_file)}
+            if uploaded.get(__local_file) == entry:
+                logger.info("Skip : %s  already uploaded to Target: %s" % (__local_file, __s3file))
+                results.append({"file": __local_file, "key": __s3file, "bytes": entry["size"], "seconds": 0.0,
+                                "skipped": True})
+                continue
+            future = get_upload_executor(max_workers).submit(upload, __local_file, __s3file, entry)
+            futures.append((future, __local_file, entry))
+
+        for future, __local_file, entry in futures:
+            results.append(future.result())
+            uploaded[__local_file] = entry
     except Exception as e:
         logger.error(" ... Failed!! Quitting Upload!!")
         logger.error(e)
         raise e
+    finally:
+        save_manifest(manifest, uploaded)
+
+    logger.info("Uploaded %d files, %d bytes, skipped %d files"
+                % (len(futures), sum(r["bytes"] for r in results if not r["skipped"]),
+                   sum(r["skipped"] for r in results)))
+    return results
+
+
+region_ip_pools = {}
 
 
 def random_ipv4_from_region(region_name):
-    ip_map = config.region_ip_map
+    ip_map = getattr(config, "region_ip_map", {})
     try:
         cidr = ip_map[region_name]
-    except:
+    except KeyError:
         print("region name is not in the region_ip_map! Using default region.")
         cidr = '54.242.0.0/15'
-    return random.choice([str(ip) for ip in ipaddress.IPv4Network(cidr)])
\ No newline at end of file
+    if cidr not in region_ip_pools:
+        region_ip_pools[cidr] = IPPool([cidr])
+    return region_ip_pools[cidr].run()
\ No newline at end of file
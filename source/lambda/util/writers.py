@@ -0,0 +1,159 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import bz2
+import gzip
+import io
+import lzma
+import os
+import time
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+MiB = 1024 * 1024
+
+# Codec used for each file extension, other extensions are written uncompressed.
+codec_extensions = {".gz": "gzip", ".bz2": "bz2", ".xz": "xz", ".zst": "zstd"}
+
+# Columnar format used for each file extension, see util.columnar (which needs pyarrow).
+columnar_extensions = {".parquet": "parquet", ".arrow": "arrow"}
+
+# Speed oriented defaults, generating load matters more than the compression ratio.
+default_levels = {"gzip": 1, "bz2": 1, "xz": 0, "zstd": 3}
+
+# Valid compression levels of each codec, bounds included.
+level_ranges = {"gzip": (0, 9), "bz2": (1, 9), "xz": (0, 9), "zstd": (1, 22)}
+
+
+def codec_from_filename(filename):
+    """Return the codec matching the extension of a file."""
+    return codec_extensions.get(os.path.splitext(filename)[1].lower(), "none")
+
+
+def columnar_format(filename):
+    """Return the columnar format matching the extension of a file, or None."""
+    for ext, file_format in columnar_extensions.items():
+        if filename.lower().endswith(ext):
+            return file_format
+    return None
+
+
+def open_codec(stream, codec, level=None):
+    """Return a binary stream compressing into stream with the given codec (gzip, bz2, xz, zstd or none)."""
+    level = default_levels.get(codec) if level is None else level
+    if codec == "gzip":
+        # No modification time in the header, the same lines always give the same bytes
+        return gzip.GzipFile(fileobj=stream, mode="wb", compresslevel=level, mtime=0)
+    if codec == "bz2":
+        return bz2.BZ2File(stream, mode="wb", compresslevel=level)
+    if codec == "xz":
+        return lzma.LZMAFile(stream, mode="wb", preset=level)
+    if codec == "zstd":
+        if zstandard is None:
+            raise ValueError("The zstd codec needs the zstandard package")
+        return zstandard.ZstdCompressor(level=level).stream_writer(stream, closefd=False)
+    if codec == "none":
+        return stream
+    raise ValueError("Unsupported codec '{}'".format(codec))
+
+
+class CountingStream(io.RawIOBase):
+    """Binary stream counting the bytes written to the underlying stream."""
+
+    def __init__(self, stream):
+        super().__init__()
+        self.stream = stream
+        self.bytes_written = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.stream.write(data)
+        self.bytes_written += len(data)
+        return len(data)
+
+    def flush(self):
+        self.stream.flush()
+
+    def close(self):
+        if not self.closed:
+            super().close()
+            self.stream.close()
+
+
+class BulkWriter:
+    """Text output accumulating lines into large buffers which are encoded, compressed and written in bulk.
+
+    It can replace a text file (write, flush and close), print() included, and reports the raw and compressed
+    sizes and the time spent encoding, compressing and writing.
+    """
+
+    def __init__(self, stream, codec="none", level=None, buffer_size=4 * MiB):
+        self.codec = codec
+        self.level = default_levels.get(codec) if level is None else level
+        self.buffer_size = buffer_size
+        self.output = CountingStream(stream)
+        self.compressor = open_codec(self.output, codec, self.level)
+        self.pending = []
+        self.pending_size = 0
+        self.raw_bytes = 0
+        self.seconds = 0.0
+        self.closed = False
+
+    def write(self, text):
+        self.pending.append(text)
+        self.pending_size += len(text)
+        if self.pending_size >= self.buffer_size:
+            self._write_pending()
+        return len(text)
+
+    def write_lines(self, lines):
+        """Write a list of lines, a newline is appended to every line."""
+        self.write("\n".join(lines) + "\n")
+
+    def _write_pending(self):
+        if not self.pending:
+            return
+
+        start_time = time.perf_counter()
+        data = "".join(self.pending).encode("utf-8")
+        self.pending = []
+        self.pending_size = 0
+        self.compressor.write(data)
+        self.raw_bytes += len(data)
+        self.seconds += time.perf_counter() - start_time
+
+    def flush(self):
+        self._write_pending()
+        start_time = time.perf_counter()
+        self.compressor.flush()
+        self.seconds += time.perf_counter() - start_time
+
+    def close(self):
+        if self.closed:
+            return
+
+        self._write_pending()
+        start_time = time.perf_counter()
+        if self.compressor is not self.output:
+            self.compressor.close()
+        self.output.close()
+        self.seconds += time.perf_counter() - start_time
+        self.closed = True
+
+    def stats(self):
+        """Return the raw and compressed sizes and the compressed bytes/sec of the codec."""
+        compressed_bytes = self.output.bytes_written
+        return {
+            "codec": self.codec,
+            "level": self.level,
+            "raw_bytes": self.raw_bytes,
+            "compressed_bytes": compressed_bytes,
+            "ratio": compressed_bytes / self.raw_bytes if self.raw_bytes else 0.0,
+            "seconds": self.seconds,
+            "compressed_bytes_per_sec": compressed_bytes / self.seconds if self.seconds > 0 else 0.0,
+        }
@@ -127,6 +127,17 @@ export class LogFakerStack extends Construct {
             layers: [fakerLayer]
         })
         fakeLogGenerator.node.addDependency(fakeLogGeneratorRole, fakeLogGeneratorPolicy);
+        // Large jobs are split into sub-jobs, each one run by an asynchronous invocation of the function itself.
+        // A separate policy avoids a dependency cycle between the function and its role.
+        const fakeLogGeneratorInvokePolicy = new iam.Policy(this, 'fakeLogGeneratorInvokePolicy', {
+            statements: [
+                new iam.PolicyStatement({
+                    actions: ["lambda:InvokeFunction"],
+                    resources: [fakeLogGenerator.functionArn],
+                }),
+            ]
+        });
+        fakeLogGeneratorInvokePolicy.attachToRole(fakeLogGeneratorRole);
         
         // Get the logBucket
         const logBucket = s3.Bucket.fromBucketName(this, 'logBucket', props.logBucketName);
@@ -27,7 +27,9 @@ setup_python_env() {
     echo "Installing python packages"
     # install test dependencies in the python virtual environment
 	pip3 install -r requirements-test.txt
-	pip3 install -r requirements.txt --target .
+	if [ -f requirements.txt ]; then
+		pip3 install -r requirements.txt --target .
+	fi
 
 	echo "deactivate virtual environment"
 	deactivate
@@ -144,6 +146,9 @@ coverage_reports_top_path=$source_dir/test/coverage-reports
 # Test the CDK project
 run_cdk_project_test $source_dir
 
+# Test the log generator Lambda function, its runtime dependencies come from requirements-test.txt
+run_python_test $source_dir/lambda lambda
+
 # Test the attached Lambda function
 # run_javascript_test $source_dir/lambda/example-function-js example-function-js
 